@@ -0,0 +1,593 @@
+"""AI analýza studijních textů pomocí OpenAI.
+
+Dlouhé texty se rozdělí na části podle odstavců, části se analyzují
+souběžně (map) a dílčí výsledky se sloučí do jednoho JSON ve stejném
+tvaru, jaký očekává frontend (reduce). Každá část má vlastní záznam
+v cache, takže po úpravě dokumentu se znovu analyzují jen změněné části.
+Krátké texty lze také streamovat, položky se vrací průběžně už během
+generování odpovědi.
+
+Klient OpenAI je jeden na proces a drží otevřená spojení (keep-alive),
+počet souběžných spojení je omezený. Když stejný text analyzuje víc
+requestů najednou, na OpenAI jde jen jedno volání a ostatní počkají na
+jeho výsledek.
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import httpx
+import openai
+
+from analysis_cache import make_cache_key, normalize_text
+from analysis_parsing import AnalysisFormatError, parse_analysis, validate_item, validate_result
+
+# Při změně promptu nebo tvaru výsledku zvyšte verzi, aby se nepoužívaly staré výsledky z cache
+# (2: JSON mód a validace odpovědí, výsledek nese model, který ho vytvořil)
+PROMPT_VERSION = 2
+ANALYSIS_PROMPT = """
+        Analyzuj následující studijní text a vytvoř:
+
+        1. SHRNUTÍ - hlavní body a klíčové informace (3-5 bodů)
+        2. TESTOVÉ OTÁZKY - 5 otázek s multiple choice možnostmi (A, B, C, D) včetně správných odpovědí
+        3. KARTIČKY - 5 dvojic otázka-odpověď pro procvičování
+
+        Odpovídej ve formátu JSON:
+        {{
+            "summary": ["bod1", "bod2", "bod3"],
+            "questions": [
+                {{
+                    "question": "text otázky",
+                    "options": ["A) možnost1", "B) možnost2", "C) možnost3", "D) možnost4"],
+                    "correct": "A"
+                }}
+            ],
+            "flashcards": [
+                {{
+                    "question": "otázka",
+                    "answer": "odpověď"
+                }}
+            ]
+        }}
+
+        Text k analýze:
+        {text}
+        """
+
+SECTIONS = ('summary', 'questions', 'flashcards')
+
+_SECTION_START_RE = re.compile(r'"(summary|questions|flashcards)"\s*:\s*\[')
+_decoder = json.JSONDecoder()
+
+# Čeština má v průměru kratší tokeny než angličtina, odhad je záměrně opatrný
+CHARS_PER_TOKEN = 3
+
+_PARAGRAPH_RE = re.compile(r'\n\s*\n|\n')
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def error_result(message):
+    return {
+        "error": message,
+        "summary": ["Nepodařilo se analyzovat text"],
+        "questions": [],
+        "flashcards": []
+    }
+
+
+class IncrementalAnalysisParser:
+    """Parser neúplného JSON z průběžně streamované odpovědi.
+
+    Z přicházejících kousků textu vrací hotové položky polí ``summary``,
+    ``questions`` a ``flashcards``, jakmile jsou celé. Nedokončená položka
+    se jen přeskočí a zkusí se znovu po dalším kousku.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.items = {section: [] for section in SECTIONS}
+        self._section = None
+        self._pos = 0
+
+    def feed(self, delta):
+        """Přidá kousek odpovědi a vrátí nově dokončené položky [(sekce, položka)]"""
+        self.buffer += delta
+        return list(self._scan())
+
+    def _scan(self):
+        buffer = self.buffer
+        while True:
+            if self._section is None:
+                match = _SECTION_START_RE.search(buffer, self._pos)
+                if not match:
+                    return
+                self._section = match.group(1)
+                self._pos = match.end()
+            while self._pos < len(buffer) and buffer[self._pos] in ' \t\r\n,':
+                self._pos += 1
+            if self._pos >= len(buffer):
+                return
+            if buffer[self._pos] == ']':
+                self._section = None
+                self._pos += 1
+                continue
+            try:
+                item, end = _decoder.raw_decode(buffer, self._pos)
+            except json.JSONDecodeError:
+                return
+            self._pos = end
+            # Čísla a literály mohou být ještě neúplné, neplatné položky se neposílají
+            item = validate_item(self._section, item) if isinstance(item, (str, dict)) else None
+            if item is None:
+                continue
+            self.items[self._section].append(item)
+            yield self._section, item
+
+    def result(self):
+        """Vrátí (výsledek, opraveno); když odpověď není platný JSON, složí
+        výsledek z hotových položek. Nepoužitelná odpověď vyhodí AnalysisFormatError."""
+        try:
+            return parse_analysis(self.buffer)
+        except AnalysisFormatError:
+            if not any(self.items.values()):
+                raise
+        return validate_result(self.items), True
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _split_oversized(block, max_chars):
+    """Rozdělí příliš dlouhý odstavec po větách, v nouzi natvrdo"""
+    pieces = []
+    current = ''
+    for sentence in _SENTENCE_RE.split(block):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + len(sentence) + 1 > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f'{current} {sentence}' if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text, max_tokens):
+    """Rozdělí text na části do ``max_tokens`` tokenů na hranicích odstavců"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = []
+    current_len = 0
+    for paragraph in _PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph] if len(paragraph) <= max_chars else _split_oversized(paragraph, max_chars)
+        for piece in pieces:
+            if current and current_len + len(piece) + 1 > max_chars:
+                chunks.append('\n'.join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 1
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def _item_key(item):
+    if isinstance(item, dict):
+        item = item.get('question', '')
+    return normalize_text(str(item)).lower()
+
+
+def merge_results(results, max_items=10):
+    """Sloučí dílčí výsledky; položky se berou střídavě ze všech částí,
+    aby výsledek pokrýval celý dokument, a duplicity se vynechají"""
+    merged = {section: [] for section in SECTIONS}
+    for section in SECTIONS:
+        seen = set()
+        columns = [list(result.get(section) or []) for result in results]
+        depth = max((len(column) for column in columns), default=0)
+        for index in range(depth):
+            for column in columns:
+                if index >= len(column) or len(merged[section]) >= max_items:
+                    continue
+                key = _item_key(column[index])
+                if key in seen:
+                    continue
+                seen.add(key)
+                merged[section].append(column[index])
+    return merged
+
+
+def result_events(result):
+    if not result.get('error'):
+        for section in SECTIONS:
+            for item in result.get(section) or []:
+                yield section, item
+    yield 'done', result
+
+
+def retry_delay(attempt, backoff):
+    """Čekání před ``attempt``-tým opakováním: exponenciálně rostoucí s náhodným
+    rozptylem, aby souběžné požadavky nenarazily na limit API znovu najednou"""
+    return backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def is_retryable(error):
+    """Chyby, u kterých má smysl zkusit stejný model znovu"""
+    return isinstance(error, (
+        AnalysisFormatError, openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError
+    ))
+
+
+def _error_reason(error):
+    if isinstance(error, AnalysisFormatError):
+        return 'invalid_json'
+    if isinstance(error, openai.APITimeoutError):
+        return 'timeout'
+    if isinstance(error, openai.RateLimitError):
+        return 'rate_limit'
+    if isinstance(error, openai.APIConnectionError):
+        return 'connection'
+    if isinstance(error, openai.APIStatusError):
+        return f'http_{error.status_code}'
+    return 'error'
+
+
+class TextAnalyzer:
+    """Analýza textu přes OpenAI s cache a rozdělením dlouhých textů.
+
+    Každé volání má ``timeout``; při vypršení, limitu API, chybě serveru
+    nebo neplatném JSON se zopakuje až ``max_retries``krát s rostoucím
+    čekáním a pak se zkusí další model z ``fallback_models``.
+
+    Klienti OpenAI se vytvoří při prvním volání a sdílí je všechna vlákna;
+    ``max_connections`` omezuje počet současně otevřených spojení (další
+    volání čekají na volné spojení). Asynchronní klient pro dlouhé texty
+    běží ve vlastní smyčce událostí na pozadí, aby jeho spojení přežila
+    mezi requesty.
+    """
+
+    def __init__(self, cache, model='gpt-3.5-turbo', chunk_tokens=3000, concurrency=4, max_items=10,
+                 instrumentation=None, fallback_models=(), timeout=60.0, max_retries=2, backoff=1.0,
+                 json_mode=True, max_connections=20):
+        self.cache = cache
+        self.instrumentation = instrumentation
+        self.model = model
+        self.fallback_models = [name for name in fallback_models if name and name != model]
+        self.chunk_tokens = chunk_tokens
+        self.concurrency = concurrency
+        self.max_items = max_items
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.json_mode = json_mode
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._client_instance = None
+        self._async_client = None
+        self._loop = None
+        # Rozpracované analýzy podle klíče cache, na které mohou čekat další requesty
+        self._inflight = {}
+
+    @property
+    def models(self):
+        return [self.model] + self.fallback_models
+
+    def analyze(self, text):
+        """Vrátí analýzu textu ve tvaru {summary, questions, flashcards}"""
+        chunks = split_into_chunks(text, self.chunk_tokens) or [text]
+        if len(chunks) == 1:
+            return self._analyze_chunk(chunks[0])
+        results = self._run_async(self._analyze_chunks(chunks))
+        successful = [result for result in results if not result.get('error')]
+        if not successful:
+            return results[0]
+        return merge_results(successful, self.max_items)
+
+    def cached(self, text):
+        """Analýza textu jen z cache (bez volání OpenAI), nebo None, když některá část chybí"""
+        chunks = split_into_chunks(text, self.chunk_tokens) or [text]
+        results = []
+        for chunk in chunks:
+            result = self.cache.get(self._cache_key(chunk), record=False)
+            if result is None:
+                # Minutí započítá až analýza, která text opravdu zpracuje
+                return None
+            results.append(result)
+        self.cache.record_hits(len(results))
+        return results[0] if len(results) == 1 else merge_results(results, self.max_items)
+
+    def stream(self, text):
+        """Generátor událostí (sekce, položka) a nakonec ('done', výsledek).
+
+        Krátké texty se streamují přímo z OpenAI, výsledky z cache a dlouhé
+        texty analyzované po částech se odešlou najednou po dokončení. Když
+        stream selže dřív, než se odeslala první položka, analýza se dokončí
+        bez streamování s opakováním a záložními modely.
+        """
+        chunks = split_into_chunks(text, self.chunk_tokens) or [text]
+        if len(chunks) > 1:
+            result = self.analyze(text)
+            yield from result_events(result)
+            return
+
+        cache_key = self._cache_key(chunks[0])
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            yield from result_events(cached)
+            return
+
+        future, leader = self._claim(cache_key)
+        if not leader:
+            yield from result_events(future.result())
+            return
+        result = None
+        try:
+            for section, item in self._stream_chunk(chunks[0], cache_key):
+                if section == 'done':
+                    result = item
+                yield section, item
+        finally:
+            self._release(cache_key, future, result)
+
+    def _stream_chunk(self, text, cache_key):
+        parser = IncrementalAnalysisParser()
+        emitted = False
+        try:
+            client = self._client()
+            # Streamovaná odpověď neobsahuje počty tokenů, měří se jen čas
+            with self._observed('stream', self.model):
+                response = client.chat.completions.create(**self._request(self.model, text, stream=True))
+                try:
+                    for chunk in response:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            for event in parser.feed(delta):
+                                emitted = True
+                                yield event
+                finally:
+                    # Vrátí spojení do poolu i při přerušeném streamu
+                    response.response.close()
+            result, repaired = parser.result()
+            self._record_response(self.model, 'repaired' if repaired else 'valid')
+            result['model'] = self.model
+        except Exception as e:
+            if isinstance(e, AnalysisFormatError):
+                self._record_response(self.model, 'invalid')
+            if emitted:
+                yield 'done', error_result(f"Chyba při analýze: {str(e)}")
+                return
+            self._record_retry(self.model, e)
+            yield from result_events(self._compute_chunk(text, cache_key))
+            return
+
+        self.cache.set(cache_key, result)
+        yield 'done', result
+
+    def _limits(self):
+        return httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+
+    def _client(self):
+        with self._lock:
+            if self._client_instance is None:
+                # Opakování řeší TextAnalyzer sám, aby šlo měřit a přepnout na záložní model
+                self._client_instance = openai.OpenAI(
+                    timeout=self.timeout,
+                    max_retries=0,
+                    http_client=httpx.Client(limits=self._limits(), timeout=self.timeout)
+                )
+            return self._client_instance
+
+    def _get_async_client(self):
+        # Volá se jen ve smyčce událostí na pozadí, zámek není potřeba
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                timeout=self.timeout,
+                max_retries=0,
+                http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+            )
+        return self._async_client
+
+    def _run_async(self, coroutine):
+        """Spustí korutinu ve sdílené smyčce událostí a počká na výsledek"""
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='openai-async', daemon=True).start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
+
+    def close(self):
+        """Zavře sdílené klienty a smyčku událostí (např. při ukončení benchmarku)"""
+        with self._lock:
+            client, self._client_instance = self._client_instance, None
+            loop, self._loop = self._loop, None
+        if client is not None:
+            client.close()
+        if loop is not None:
+            if self._async_client is not None:
+                asyncio.run_coroutine_threadsafe(self._async_client.close(), loop).result()
+                self._async_client = None
+            loop.call_soon_threadsafe(loop.stop)
+
+    def _claim(self, cache_key):
+        """Vrátí (future, leader); jen leader volá OpenAI, ostatní čekají na future"""
+        with self._lock:
+            future = self._inflight.get(cache_key)
+            if future is not None:
+                if self.instrumentation is not None:
+                    self.instrumentation.observe_openai_coalesced(self.model)
+                return future, False
+            future = self._inflight[cache_key] = Future()
+            return future, True
+
+    def _release(self, cache_key, future, result):
+        with self._lock:
+            self._inflight.pop(cache_key, None)
+        future.set_result(result if result is not None else error_result("Chyba při analýze: analýza byla přerušena"))
+
+    def _request(self, model, text, stream=False):
+        request = {
+            'model': model,
+            'messages': [{"role": "user", "content": ANALYSIS_PROMPT.format(text=text)}],
+            'temperature': 0.7,
+        }
+        if stream:
+            request['stream'] = True
+        if self.json_mode:
+            request['response_format'] = {'type': 'json_object'}
+        return request
+
+    def _parse(self, model, response):
+        try:
+            result, repaired = parse_analysis(response.choices[0].message.content)
+        except AnalysisFormatError:
+            self._record_response(model, 'invalid')
+            raise
+        self._record_response(model, 'repaired' if repaired else 'valid')
+        result['model'] = model
+        return result
+
+    def _complete(self, text):
+        """Jedno volání s opakováním a záložními modely; při neúspěchu vyhodí poslední chybu"""
+        client = self._client()
+        error = None
+        for model in self.models:
+            if error is not None:
+                self._record_fallback(model)
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._record_retry(model, error)
+                    time.sleep(retry_delay(attempt, self.backoff))
+                try:
+                    with self._observed('sync', model) as call:
+                        response = client.chat.completions.create(**self._request(model, text))
+                        call.usage = response.usage
+                    return self._parse(model, response)
+                except Exception as e:
+                    error = e
+                    if not is_retryable(e):
+                        break
+        raise error
+
+    async def _complete_async(self, client, text):
+        error = None
+        for model in self.models:
+            if error is not None:
+                self._record_fallback(model)
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._record_retry(model, error)
+                    await asyncio.sleep(retry_delay(attempt, self.backoff))
+                try:
+                    with self._observed('async', model) as call:
+                        response = await client.chat.completions.create(**self._request(model, text))
+                        call.usage = response.usage
+                    return self._parse(model, response)
+                except Exception as e:
+                    error = e
+                    if not is_retryable(e):
+                        break
+        raise error
+
+    @contextmanager
+    def _observed(self, mode, model):
+        """Změří volání OpenAI; do ``call.usage`` lze uložit spotřebu tokenů"""
+        call = SimpleNamespace(usage=None)
+        if self.instrumentation is None:
+            yield call
+            return
+        started = time.perf_counter()
+        try:
+            yield call
+        except Exception:
+            self.instrumentation.observe_openai(model, mode, time.perf_counter() - started, error=True)
+            raise
+        self.instrumentation.observe_openai(model, mode, time.perf_counter() - started, call.usage)
+
+    def _record_response(self, model, outcome):
+        if self.instrumentation is not None:
+            self.instrumentation.observe_openai_response(model, outcome)
+
+    def _record_retry(self, model, error):
+        if self.instrumentation is not None:
+            self.instrumentation.observe_openai_retry(model, _error_reason(error))
+
+    def _record_fallback(self, model):
+        if self.instrumentation is not None:
+            self.instrumentation.observe_openai_fallback(model)
+
+    def _cache_key(self, text):
+        return make_cache_key(text, self.model, PROMPT_VERSION)
+
+    def _analyze_chunk(self, text):
+        cache_key = self._cache_key(text)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        future, leader = self._claim(cache_key)
+        if not leader:
+            return future.result()
+        result = None
+        try:
+            result = self._compute_chunk(text, cache_key)
+        finally:
+            self._release(cache_key, future, result)
+        return result
+
+    def _compute_chunk(self, text, cache_key):
+        # Mezitím mohl stejný text dokončit jiný request; minutí už je započítané
+        cached = self.cache.get(cache_key, record=False)
+        if cached is not None:
+            return cached
+        try:
+            result = self._complete(text)
+        except Exception as e:
+            return error_result(f"Chyba při analýze: {str(e)}")
+
+        # Chybové výsledky se do cache neukládají (řeší AnalysisCache.set)
+        self.cache.set(cache_key, result)
+        return result
+
+    async def _analyze_chunks(self, chunks):
+        client = self._get_async_client()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def analyze_one(text):
+            cache_key = self._cache_key(text)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+            future, leader = self._claim(cache_key)
+            if not leader:
+                return await asyncio.wrap_future(future)
+            result = None
+            try:
+                async with semaphore:
+                    try:
+                        result = await self._complete_async(client, text)
+                    except Exception as e:
+                        result = error_result(f"Chyba při analýze: {str(e)}")
+                        return result
+                self.cache.set(cache_key, result)
+                return result
+            finally:
+                self._release(cache_key, future, result)
+
+        return await asyncio.gather(*(analyze_one(chunk) for chunk in chunks))
@@ -0,0 +1,197 @@
+"""Cache výsledků AI analýzy adresovaná obsahem analyzovaného textu."""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Sjednotí bílé znaky, aby drobné rozdíly ve formátování nevytvářely nové klíče"""
+    return _WHITESPACE_RE.sub(' ', text or '').strip()
+
+
+def make_cache_key(text, model, prompt_version):
+    """Vrátí klíč cache z normalizovaného textu, modelu a verze promptu"""
+    digest = hashlib.sha256()
+    digest.update(f'{model}\0{prompt_version}\0'.encode('utf-8'))
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MemoryBackend:
+    """LRU cache v paměti procesu s omezenou dobou platnosti záznamů"""
+
+    def __init__(self, max_entries=512, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """Perzistentní cache v SQLite souboru, přežije restart aplikace"""
+
+    def __init__(self, path, ttl=7 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS analysis_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < time.time():
+                self._conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            return row[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO analysis_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, value, time.time() + self.ttl)
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute('DELETE FROM analysis_cache WHERE key = ?', (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM analysis_cache')
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+
+
+class AnalysisCache:
+    """Vícevrstvá cache výsledků analýzy (rychlejší vrstvy první)"""
+
+    def __init__(self, backends):
+        self.backends = list(backends)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, record=True):
+        """Vrátí uložený výsledek nebo None.
+
+        Při ``record=False`` se dotaz nezapočítá do zásahů a minutí (opakovaná
+        kontrola téhož klíče v rámci jedné analýzy).
+        """
+        for index, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                # Povýšení záznamu do rychlejších vrstev
+                for faster in self.backends[:index]:
+                    faster.set(key, value)
+                if record:
+                    self._count(hit=True)
+                return json.loads(value)
+        if record:
+            self._count(hit=False)
+        return None
+
+    def record_hits(self, count=1):
+        """Započítá zásahy nalezené dotazem s ``record=False``"""
+        with self._lock:
+            self.hits += count
+
+    def set(self, key, result):
+        """Uloží výsledek; chybové výsledky se nikdy neukládají"""
+        if not isinstance(result, dict) or result.get('error'):
+            return False
+        value = json.dumps(result, ensure_ascii=False)
+        for backend in self.backends:
+            backend.set(key, value)
+        return True
+
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+
+    def stats(self):
+        """Počitadla zásahů a minutí pro monitoring"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'backends': {type(backend).__name__: len(backend) for backend in self.backends},
+        }
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+
+def create_analysis_cache(config):
+    """Sestaví cache podle konfigurace aplikace (memory, sqlite nebo tiered)"""
+    backend = config.get('ANALYSIS_CACHE_BACKEND', 'tiered')
+    ttl = config.get('ANALYSIS_CACHE_TTL', 24 * 3600)
+    backends = []
+    if backend in ('memory', 'tiered'):
+        backends.append(MemoryBackend(max_entries=config.get('ANALYSIS_CACHE_SIZE', 512), ttl=ttl))
+    if backend in ('sqlite', 'tiered'):
+        backends.append(SQLiteBackend(config['ANALYSIS_CACHE_PATH'], ttl=config.get('ANALYSIS_CACHE_DISK_TTL', ttl)))
+    if not backends:
+        raise ValueError(f'Neznámý backend cache: {backend}')
+    return AnalysisCache(backends)
@@ -0,0 +1,161 @@
+"""Parsování a validace JSON odpovědí AI.
+
+Model občas vrátí JSON obalený v bloku kódu nebo v textu, s čárkou před
+uzavírací závorkou, nebo odpověď utne uprostřed. Takové odpovědi se
+opraví, místo aby se celé (pomalé) volání zahodilo. Výsledek se pak ověří
+proti tvaru {summary, questions, flashcards}, který očekává frontend.
+Neplatné položky se vynechají. Když nezbude žádná, vyhodí se
+AnalysisFormatError a volání se zopakuje.
+"""
+import json
+import re
+
+from analysis_cache import normalize_text
+
+_CODE_FENCE_RE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$')
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class AnalysisFormatError(ValueError):
+    """Odpověď AI nejde převést na platný výsledek analýzy"""
+
+
+def strip_code_fence(content):
+    return _CODE_FENCE_RE.sub('', content).strip()
+
+
+def _drop_trailing_commas(text):
+    """Odstraní čárky před } a ] mimo řetězce"""
+    out = []
+    in_string = escaped = False
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ',':
+            rest = text[index + 1:].lstrip()
+            if not rest or rest[0] in '}]':
+                continue
+        out.append(char)
+    return ''.join(out)
+
+
+def _close_truncated(text):
+    """Uzavře řetězec a závorky useknuté odpovědi"""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in '}]' and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    if text.endswith(','):
+        text = text[:-1]
+    elif text.endswith(':'):
+        text += ' null'
+    return text + ''.join(reversed(stack))
+
+
+def repair_json(content):
+    """Pokusí se z téměř platné odpovědi udělat platný JSON objekt"""
+    text = strip_code_fence(content)
+    start = text.find('{')
+    if start == -1:
+        raise AnalysisFormatError('Odpověď AI neobsahuje JSON objekt')
+    end = text.rfind('}')
+    candidates = []
+    if end > start:
+        candidates.append(text[start:end + 1])
+    # Useknutá odpověď: konec textu není konec objektu
+    candidates.append(text[start:])
+    for candidate in candidates:
+        for repaired in (_drop_trailing_commas(candidate), _close_truncated(_drop_trailing_commas(candidate))):
+            try:
+                return json.loads(repaired)
+            except json.JSONDecodeError:
+                continue
+    raise AnalysisFormatError('Odpověď AI nebyla ve formátu JSON')
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _items(data, section):
+    items = data.get(section)
+    return items if isinstance(items, list) else []
+
+
+def _question(item):
+    if not isinstance(item, dict):
+        return None
+    question = _text(item.get('question'))
+    options = item.get('options')
+    if not question or not isinstance(options, list):
+        return None
+    options = [option.strip() for option in options if _text(option)]
+    correct = _text(item.get('correct'))
+    if len(options) < 2 or not correct:
+        return None
+    correct = correct[0].upper()
+    if correct not in 'ABCDEFGH'[:len(options)]:
+        return None
+    return {'question': question, 'options': options, 'correct': correct}
+
+
+def _flashcard(item):
+    if not isinstance(item, dict):
+        return None
+    question = _text(item.get('question'))
+    answer = _text(item.get('answer'))
+    if not question or not answer:
+        return None
+    return {'question': question, 'answer': answer}
+
+
+_VALIDATORS = {'summary': _text, 'questions': _question, 'flashcards': _flashcard}
+
+
+def validate_item(section, item):
+    """Položka sekce v očekávaném tvaru, nebo None, pokud je neplatná"""
+    return _VALIDATORS[section](item)
+
+
+def validate_result(data):
+    """Výsledek ve tvaru {summary, questions, flashcards} jen s platnými položkami"""
+    if not isinstance(data, dict):
+        raise AnalysisFormatError('Odpověď AI není JSON objekt')
+    result = {}
+    for section, validate in _VALIDATORS.items():
+        result[section] = [item for item in map(validate, _items(data, section)) if item]
+    if not any(result.values()):
+        raise AnalysisFormatError('Odpověď AI neobsahuje shrnutí, otázky ani kartičky')
+    return result
+
+
+def parse_analysis(content):
+    """Vrátí (výsledek, opraveno) nebo vyhodí AnalysisFormatError"""
+    if not normalize_text(content or ''):
+        raise AnalysisFormatError('Prázdná odpověď AI')
+    try:
+        return validate_result(json.loads(strip_code_fence(content))), False
+    except json.JSONDecodeError:
+        return validate_result(repair_json(content)), True
@@ -0,0 +1,94 @@
+"""Data pro grafy na stránce statistik, počítaná z denních souhrnů.
+
+Dotazy čtou jen řádky DailyStudyRollup ve zvoleném rozsahu, takže jejich
+cena závisí na délce rozsahu, ne na počtu uložených studijních relací.
+"""
+from datetime import date, datetime, timedelta
+
+from models import db, DailyStudyRollup
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 3 * 366
+PERIODS = ('day', 'week')
+
+
+def parse_date_range(args):
+    """Načte rozsah ?from=RRRR-MM-DD&to=RRRR-MM-DD (výchozí posledních 30 dní)"""
+    try:
+        end = date.fromisoformat(args['to']) if args.get('to') else datetime.utcnow().date()
+        start = date.fromisoformat(args['from']) if args.get('from') else end - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    except ValueError:
+        raise ValueError('Datum musí být ve formátu RRRR-MM-DD')
+    if start > end:
+        raise ValueError('Začátek rozsahu je po jeho konci')
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Rozsah může mít nejvýše {MAX_RANGE_DAYS} dní')
+    return start, end
+
+
+def rollups_last_modified(user_id, start, end):
+    """Čas poslední změny souhrnů v rozsahu (pro hlavičku Last-Modified)"""
+    return db.session.query(db.func.max(DailyStudyRollup.updated_at)).filter(
+        DailyStudyRollup.user_id == user_id,
+        DailyStudyRollup.day >= start,
+        DailyStudyRollup.day <= end
+    ).scalar()
+
+
+def _bucket_start(day, period):
+    if period == 'week':
+        return day - timedelta(days=day.weekday())  # pondělí
+    return day
+
+
+def study_time_series(user_id, start, end, period='day'):
+    """Minuty a počet relací po dnech nebo týdnech, včetně prázdných období"""
+    if period not in PERIODS:
+        raise ValueError('Období musí být day nebo week')
+    step = timedelta(days=7 if period == 'week' else 1)
+    buckets = {}
+    current = _bucket_start(start, period)
+    while current <= end:
+        buckets[current] = {'date': current.isoformat(), 'minutes': 0, 'sessions': 0}
+        current += step
+
+    rows = db.session.query(
+        DailyStudyRollup.day,
+        db.func.sum(DailyStudyRollup.study_minutes),
+        db.func.sum(DailyStudyRollup.sessions_count)
+    ).filter(
+        DailyStudyRollup.user_id == user_id,
+        DailyStudyRollup.day >= start,
+        DailyStudyRollup.day <= end
+    ).group_by(DailyStudyRollup.day).all()
+    for day, minutes, sessions in rows:
+        bucket = buckets[_bucket_start(day, period)]
+        bucket['minutes'] += minutes or 0
+        bucket['sessions'] += sessions or 0
+    return list(buckets.values())
+
+
+def subject_breakdown(user_id, start, end):
+    """Souhrn po předmětech: minuty, relace, otázky a úspěšnost"""
+    rows = db.session.query(
+        DailyStudyRollup.subject,
+        db.func.sum(DailyStudyRollup.study_minutes),
+        db.func.sum(DailyStudyRollup.sessions_count),
+        db.func.sum(DailyStudyRollup.questions_answered),
+        db.func.sum(DailyStudyRollup.correct_answers)
+    ).filter(
+        DailyStudyRollup.user_id == user_id,
+        DailyStudyRollup.day >= start,
+        DailyStudyRollup.day <= end
+    ).group_by(DailyStudyRollup.subject).order_by(db.func.sum(DailyStudyRollup.study_minutes).desc()).all()
+    return [
+        {
+            'subject': subject or 'Bez předmětu',
+            'minutes': minutes or 0,
+            'sessions': sessions or 0,
+            'questions': questions or 0,
+            'correct': correct or 0,
+            'accuracy': round(correct / questions * 100, 1) if questions else 0.0,
+        }
+        for subject, minutes, sessions, questions, correct in rows
+    ]
@@ -1,36 +1,166 @@
-from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, session
+from flask import Flask, request, render_template, jsonify, redirect, url_for, flash, session, Response, stream_with_context, make_response
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 import os
 import json
-import PyPDF2
-from docx import Document
+import hashlib
+import math
 import openai
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
-from models import db, User, StudySession, Note, UserProgress
+from models import db, User, StudySession, Note, UserProgress, AnalysisJob, AnalysisPayload, Tag, UserStats, DailyStudyRollup, Flashcard, get_or_create
 from forms import LoginForm, RegisterForm, NoteForm
-from datetime import datetime
+from analysis_cache import create_analysis_cache
+from analysis import TextAnalyzer, result_events
+from catalogue import precompute_catalogue, precomputed_result, prune_removed
+from jobs import JobQueue, QueueFullError
+from extractors import allowed_file, extract_text, file_extension
+from materials import MaterialsRepository
+from search import apply_search, highlight_snippet
+from analytics import parse_date_range, study_time_series, subject_breakdown, rollups_last_modified
+from instrumentation import Instrumentation
+from database import engine_options, install_sqlite_pragmas, normalize_database_url
+from pagination import keyset_page, offset_page
+from passwords import PasswordHasherBusy, password_hasher
+from rate_limit import LoginRateLimiter
+import srs
+from semantic import EMBEDDING_DIM, NoteEmbeddings, TopicEmbeddings, VectorIndex
+from text_store import ExtractedTextStore, read_upload, upload_key
+import migrations
+import click
+from sqlalchemy import literal
+from datetime import datetime, timedelta
+import time
 
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-app.config['UPLOAD_FOLDER'] = 'uploads'
+app.config['EXTRACTION_CHAR_BUDGET'] = int(os.getenv('EXTRACTION_CHAR_BUDGET', 100000))  # max characters sent to AI
+app.config['PDF_WORKERS'] = int(os.getenv('PDF_WORKERS', os.cpu_count() or 1))
+app.config['TEXT_STORE_PATH'] = os.getenv('TEXT_STORE_PATH', os.path.join(app.instance_path, 'extracted_texts.sqlite'))
+app.config['TEXT_STORE_MAX_MB'] = int(os.getenv('TEXT_STORE_MAX_MB', 256))  # compressed text of uploads, LRU eviction
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///studymate.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = normalize_database_url(os.getenv('DATABASE_URL', 'sqlite:///studymate.db'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 15000))  # how long writers wait for the lock
+app.config['SQLITE_SYNCHRONOUS'] = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['SQLITE_CACHE_SIZE_KB'] = int(os.getenv('SQLITE_CACHE_SIZE_KB', 20000))  # page cache per connection
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))  # Postgres etc.; keep above ANALYSIS_WORKERS + web threads
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))  # in seconds
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+app.config['STUDY_MATERIALS_PATH'] = os.getenv('STUDY_MATERIALS_PATH', os.path.join(app.root_path, 'study_materials.json'))
+app.config['NOTES_PER_PAGE'] = int(os.getenv('NOTES_PER_PAGE', 20))
+app.config['VECTOR_INDEX_PATH'] = os.getenv('VECTOR_INDEX_PATH', '')  # files shared by one process only; empty = in memory, rebuilt on start
+app.config['EMBEDDING_DIM'] = int(os.getenv('EMBEDDING_DIM', EMBEDDING_DIM))  # changing it rebuilds the index
+app.config['API_MAX_PAGE_SIZE'] = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+app.config['REVIEW_SESSION_MAX_HOURS'] = int(os.getenv('REVIEW_SESSION_MAX_HOURS', 12))  # longest review sitting; older sessions are not extended
+app.config['OPENAI_MODEL'] = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
+app.config['OPENAI_FALLBACK_MODELS'] = [m.strip() for m in os.getenv('OPENAI_FALLBACK_MODELS', '').split(',') if m.strip()]  # tried in order when OPENAI_MODEL fails
+app.config['OPENAI_TIMEOUT'] = float(os.getenv('OPENAI_TIMEOUT', 60))  # seconds per request
+app.config['OPENAI_MAX_RETRIES'] = int(os.getenv('OPENAI_MAX_RETRIES', 2))  # per model, on timeouts, rate limits, 5xx and invalid JSON
+app.config['OPENAI_RETRY_BACKOFF'] = float(os.getenv('OPENAI_RETRY_BACKOFF', 1.0))  # first retry delay in seconds, doubles each retry
+app.config['OPENAI_MAX_CONNECTIONS'] = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))  # shared keep-alive pool; further calls wait for a free connection
+app.config['OPENAI_JSON_MODE'] = os.getenv('OPENAI_JSON_MODE', 'true').lower() in ('1', 'true', 'yes')  # response_format json_object
+app.config['ANALYSIS_CHUNK_TOKENS'] = int(os.getenv('ANALYSIS_CHUNK_TOKENS', 3000))  # max tokens of text per request
+app.config['ANALYSIS_CONCURRENCY'] = int(os.getenv('ANALYSIS_CONCURRENCY', 4))  # parallel requests per document
+app.config['ANALYSIS_CACHE_BACKEND'] = os.getenv('ANALYSIS_CACHE_BACKEND', 'tiered')  # memory, sqlite, tiered
+app.config['ANALYSIS_CACHE_SIZE'] = int(os.getenv('ANALYSIS_CACHE_SIZE', 512))
+app.config['ANALYSIS_CACHE_TTL'] = int(os.getenv('ANALYSIS_CACHE_TTL', 24 * 3600))  # in seconds
+app.config['ANALYSIS_CACHE_DISK_TTL'] = int(os.getenv('ANALYSIS_CACHE_DISK_TTL', 7 * 24 * 3600))
+app.config['ANALYSIS_CACHE_PATH'] = os.getenv('ANALYSIS_CACHE_PATH', os.path.join(app.instance_path, 'analysis_cache.sqlite'))
+app.config['ANALYSIS_WORKERS'] = int(os.getenv('ANALYSIS_WORKERS', 4))  # concurrent analyses
+app.config['ANALYSIS_QUEUE_SIZE'] = int(os.getenv('ANALYSIS_QUEUE_SIZE', 32))  # waiting jobs before 503
+app.config['ANALYSIS_JOB_RETENTION_DAYS'] = int(os.getenv('ANALYSIS_JOB_RETENTION_DAYS', 30))  # finished jobs are deleted after this
+app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))  # stored hashes with another cost are rehashed on login
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))  # 0 = hash in the request thread
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))  # seconds to wait for the pool before 503
+app.config['LOGIN_MAX_FAILURES'] = int(os.getenv('LOGIN_MAX_FAILURES', 5))  # failed logins per username...
+app.config['LOGIN_FAILURE_WINDOW'] = int(os.getenv('LOGIN_FAILURE_WINDOW', 900))  # ...within this many seconds
+app.config['LOGIN_MAX_FAILURES_PER_IP'] = int(os.getenv('LOGIN_MAX_FAILURES_PER_IP', 100))  # failed logins per IP...
+app.config['LOGIN_IP_WINDOW'] = int(os.getenv('LOGIN_IP_WINDOW', 300))  # ...within this many seconds
+app.config['TRUSTED_PROXIES'] = int(os.getenv('TRUSTED_PROXIES', 0))  # reverse proxies setting X-Forwarded-For (e.g. 1 behind nginx)
+app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')  # /metrics requires "Authorization: Bearer <token>"; unset = direct localhost requests only
+app.config['SLOW_REQUEST_MS'] = int(os.getenv('SLOW_REQUEST_MS', 1000))  # slower requests are logged with their slowest queries
 
 # Initialize extensions
 db.init_app(app)
+install_sqlite_pragmas(app, db)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 login_manager.login_message = 'Pro přístup k této stránce se musíte přihlásit.'
 
-# Vytvoření upload složky
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Za reverzní proxy se adresa klienta bere z X-Forwarded-For (jen od důvěryhodných proxy)
+if app.config['TRUSTED_PROXIES']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'], x_proto=app.config['TRUSTED_PROXIES'])
+
+# Hesla se hashují v poolu procesů, pokusy o přihlášení jsou omezené
+password_hasher.configure(
+    rounds=app.config['BCRYPT_ROUNDS'],
+    max_workers=app.config['PASSWORD_HASH_WORKERS'],
+    timeout=app.config['PASSWORD_HASH_TIMEOUT']
+)
+login_limiter = LoginRateLimiter(
+    max_failures=app.config['LOGIN_MAX_FAILURES'],
+    failure_window=app.config['LOGIN_FAILURE_WINDOW'],
+    max_failures_per_ip=app.config['LOGIN_MAX_FAILURES_PER_IP'],
+    ip_window=app.config['LOGIN_IP_WINDOW']
+)
+
+# Metriky requestů, SQL dotazů, OpenAI a extrakce na /metrics
+instrumentation = Instrumentation(app, db)
+
+# Katalog studijních materiálů (načítá se znovu jen při změně souboru)
+study_materials = MaterialsRepository(app.config['STUDY_MATERIALS_PATH'])
+
+# Vektory poznámek a témat pro sémantické hledání a související materiály
+note_embeddings = NoteEmbeddings(VectorIndex(app.config['VECTOR_INDEX_PATH'] or None, dim=app.config['EMBEDDING_DIM']))
+topic_embeddings = TopicEmbeddings(study_materials, dim=app.config['EMBEDDING_DIM'])
+
+# Cache výsledků analýzy (klíčem je hash textu, modelu a verze promptu)
+analysis_cache = create_analysis_cache(app.config)
+text_analyzer = TextAnalyzer(
+    analysis_cache,
+    model=app.config['OPENAI_MODEL'],
+    chunk_tokens=app.config['ANALYSIS_CHUNK_TOKENS'],
+    concurrency=app.config['ANALYSIS_CONCURRENCY'],
+    instrumentation=instrumentation,
+    fallback_models=app.config['OPENAI_FALLBACK_MODELS'],
+    timeout=app.config['OPENAI_TIMEOUT'],
+    max_retries=app.config['OPENAI_MAX_RETRIES'],
+    backoff=app.config['OPENAI_RETRY_BACKOFF'],
+    json_mode=app.config['OPENAI_JSON_MODE'],
+    max_connections=app.config['OPENAI_MAX_CONNECTIONS']
+)
+# Texty extrahované z nahraných souborů podle hashe obsahu (stejný soubor se neextrahuje znovu)
+text_store = ExtractedTextStore(app.config['TEXT_STORE_PATH'], max_bytes=app.config['TEXT_STORE_MAX_MB'] * 1024 * 1024)
+instrumentation.add_gauge(
+    'studymate_extracted_text_requests',
+    'Zásahy a minutí úložiště extrahovaných textů od startu',
+    lambda: {
+        (('result', 'hit'),): text_store.hits,
+        (('result', 'miss'),): text_store.misses,
+    }
+)
+instrumentation.add_gauge(
+    'studymate_analysis_cache_requests',
+    'Zásahy a minutí cache výsledků analýzy od startu',
+    lambda: {
+        (('result', 'hit'),): analysis_cache.stats()['hits'],
+        (('result', 'miss'),): analysis_cache.stats()['misses'],
+    }
+)
 
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
+app.add_template_filter(highlight_snippet, 'highlight')
+
+# Kolik znaků obsahu poznámky se načítá pro náhled v seznamech
+NOTE_PREVIEW_CHARS = 200
+
 @app.route('/favicon.ico')
 def favicon():
     return '', 204
@@ -38,96 +168,18 @@ def favicon():
 # OpenAI API klíč - nastavte svůj klíč zde nebo jako environment proměnnou
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
-ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
-
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def read_txt_file(filepath):
-    """Čte obsah TXT souboru"""
-    try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return file.read()
-    except UnicodeDecodeError:
-        with open(filepath, 'r', encoding='cp1250') as file:
-            return file.read()
-
-def read_pdf_file(filepath):
-    """Čte obsah PDF souboru"""
-    text = ""
-    with open(filepath, 'rb') as file:
-        pdf_reader = PyPDF2.PdfReader(file)
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-    return text
-
-def read_docx_file(filepath):
-    """Čte obsah DOCX souboru"""
-    doc = Document(filepath)
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
-
-def load_study_materials():
-    """Načte studijní materiály z databáze (JSON soubor)"""
-    try:
-        with open('study_materials.json', 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
 def analyze_with_openai(text):
-    """Pošle text na OpenAI API a vrátí analýzu"""
-    try:
-        client = openai.OpenAI()
-        
-        prompt = f"""
-        Analyzuj následující studijní text a vytvoř:
-        
-        1. SHRNUTÍ - hlavní body a klíčové informace (3-5 bodů)
-        2. TESTOVÉ OTÁZKY - 5 otázek s multiple choice možnostmi (A, B, C, D) včetně správných odpovědí
-        3. KARTIČKY - 5 dvojic otázka-odpověď pro procvičování
-        
-        Odpovídej ve formátu JSON:
-        {{
-            "summary": ["bod1", "bod2", "bod3"],
-            "questions": [
-                {{
-                    "question": "text otázky",
-                    "options": ["A) možnost1", "B) možnost2", "C) možnost3", "D) možnost4"],
-                    "correct": "A"
-                }}
-            ],
-            "flashcards": [
-                {{
-                    "question": "otázka",
-                    "answer": "odpověď"
-                }}
-            ]
-        }}
-        
-        Text k analýze:
-        {text}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        
-        # Parsování JSON odpovědi
-        result = json.loads(response.choices[0].message.content)
-        return result
-        
-    except Exception as e:
-        return {
-            "error": f"Chyba při analýze: {str(e)}",
-            "summary": ["Nepodařilo se analyzovat text"],
-            "questions": [],
-            "flashcards": []
-        }
+    """Pošle text na OpenAI API a vrátí analýzu (dlouhé texty po částech)"""
+    return text_analyzer.analyze(text)
+
+def catalogue_result(subject, topic, filename=None):
+    """Předpočítaná analýza tématu z katalogu (flask precompute-catalogue), jinak None"""
+    if filename is not None:
+        return None
+    text = study_materials.get(subject, topic)
+    if text is None:
+        return None
+    return precomputed_result(subject, topic, text, text_analyzer.model)
 
 @app.route('/')
 def index():
@@ -144,10 +196,33 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        username = form.username.data
+        retry_after = login_limiter.retry_after(username, request.remote_addr)
+        if retry_after:
+            flash(f'Příliš mnoho pokusů o přihlášení, zkuste to znovu za {int(retry_after) // 60 + 1} min', 'error')
+            response = make_response(render_template('login_new.html', form=form), 429)
+            response.headers['Retry-After'] = str(int(retry_after) + 1)
+            return response
+        
+        user = User.query.filter_by(username=username).first()
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('Server je právě vytížený, zkuste to prosím za chvíli', 'error')
+            return render_template('login_new.html', form=form), 503
+        
+        if valid:
+            login_limiter.record_success(username, request.remote_addr)
+            if user.password_needs_rehash:
+                # Heslo uložené se starou cenou bcryptu se přehashuje s aktuální
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except PasswordHasherBusy:
+                    pass
             login_user(user, remember=form.remember_me.data)
             return redirect(url_for('dashboard'))
+        login_limiter.record_failure(username, request.remote_addr)
         flash('Nesprávné uživatelské jméno nebo heslo', 'error')
     
     return render_template('login_new.html', form=form)
@@ -161,7 +236,11 @@ def register():
     form = RegisterForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            flash('Server je právě vytížený, zkuste to prosím za chvíli', 'error')
+            return render_template('register_new.html', form=form), 503
         
         db.session.add(user)
         try:
@@ -181,129 +260,447 @@ def logout():
     flash('Byli jste odhlášeni', 'info')
     return redirect(url_for('login'))
 
+def get_user_stats(user_id):
+    """Statistiky uživatele; při prvním přístupu se dopočítají z historie a uloží"""
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = UserStats.rebuild(user_id)
+        db.session.commit()
+    return stats
+
+def study_sessions_page(user_id, cursor=None, limit=5):
+    """Studijní relace od nejnovějších, po stránkách podle (created_at, id)"""
+    query = StudySession.query.filter_by(user_id=user_id)
+    return keyset_page(query, StudySession.created_at, StudySession.id, cursor, limit)
+
+def notes_list_page(user_id, search='', tag='', cursor=None, limit=None):
+    """Stránka poznámek pro seznamy jako řádky (poznámka, náhled, úryvek).
+    
+    Celý obsah poznámek se nenačítá, jen prvních NOTE_PREVIEW_CHARS znaků.
+    Bez hledání se stránkuje podle (updated_at, id), výsledky hledání
+    zůstávají seřazené podle relevance. Neplatný kurzor vyhodí ValueError.
+    """
+    query = Note.query.options(db.defer(Note.content)).filter_by(user_id=user_id).add_columns(
+        db.func.substr(Note.content, 1, NOTE_PREVIEW_CHARS + 1).label('preview')
+    )
+    if tag:
+        query = query.join(Note.tag_objects).filter(Tag.name == tag)
+    limit = limit or app.config['NOTES_PER_PAGE']
+    
+    if search:
+        # Fulltext (FTS5) seřazený podle relevance, s úryvky
+        return offset_page(apply_search(db, query, search), cursor, limit)
+    query = query.add_columns(literal(None).label('snippet'))
+    return keyset_page(query, Note.updated_at, Note.id, cursor, limit)
+
+def api_page_size(default):
+    return max(1, min(request.args.get('limit', default, type=int), app.config['API_MAX_PAGE_SIZE']))
+
+def note_list_item(note, preview, snippet):
+    """Poznámka ze seznamu jako JSON pro API"""
+    return {
+        'id': note.id,
+        'title': note.title,
+        'preview': preview[:NOTE_PREVIEW_CHARS] if preview else '',
+        'truncated': bool(preview) and len(preview) > NOTE_PREVIEW_CHARS,
+        'snippet_html': str(highlight_snippet(snippet)) if snippet else None,
+        'subject': note.subject,
+        'tags': note.tag_list,
+        'updated_at': note.updated_at.isoformat(),
+        'edit_url': url_for('edit_note', note_id=note.id),
+        'delete_url': url_for('delete_note', note_id=note.id),
+    }
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     """Dashboard - hlavní stránka po přihlášení"""
-    # Získání statistik uživatele
-    total_sessions = StudySession.query.filter_by(user_id=current_user.id).count()
-    total_study_time = db.session.query(db.func.sum(StudySession.duration_minutes)).filter_by(user_id=current_user.id).scalar() or 0
-    total_notes = Note.query.filter_by(user_id=current_user.id).count()
+    # Získání statistik uživatele (udržované průběžně, jeden dotaz podle primárního klíče)
+    stats = get_user_stats(current_user.id)
     
-    # Poslední aktivity
-    recent_sessions = StudySession.query.filter_by(user_id=current_user.id).order_by(StudySession.created_at.desc()).limit(5).all()
-    recent_notes = Note.query.filter_by(user_id=current_user.id).order_by(Note.updated_at.desc()).limit(3).all()
+    # Poslední aktivity (první stránky seznamů, další se načítají přes API)
+    sessions_page = study_sessions_page(current_user.id, limit=5)
+    notes_page = notes_list_page(current_user.id, limit=3)
     
     return render_template('dashboard_new.html', 
-                         total_sessions=total_sessions,
-                         total_study_time=total_study_time,
-                         total_notes=total_notes,
-                         recent_sessions=recent_sessions,
-                         recent_notes=recent_notes)
+                         total_sessions=stats.total_sessions,
+                         total_study_time=stats.total_minutes,
+                         total_notes=stats.total_notes,
+                         study_streak=stats.active_streak,
+                         longest_streak=stats.longest_streak,
+                         recent_sessions=sessions_page.items,
+                         sessions_cursor=sessions_page.next_cursor,
+                         recent_notes=notes_page.items)
+
+@app.route('/api/study-sessions')
+@login_required
+def api_study_sessions():
+    """Studijní relace od nejnovějších po stránkách (?cursor=&limit=)"""
+    try:
+        page = study_sessions_page(current_user.id, request.args.get('cursor'), api_page_size(5))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        'sessions': [{
+            'id': study_session.id,
+            'topic': study_session.topic,
+            'subject': study_session.subject,
+            'duration_minutes': study_session.duration_minutes,
+            'questions_answered': study_session.questions_answered,
+            'accuracy_percentage': study_session.accuracy_percentage,
+            'created_at': study_session.created_at.isoformat(),
+        } for study_session in page.items],
+        'next_cursor': page.next_cursor
+    })
 
 @app.route('/study')
 @login_required
 def study():
     """Stránka pro analýzu materiálů"""
-    materials = load_study_materials()
-    return render_template('study_new.html', materials=materials)
+    # Stránka potřebuje jen názvy témat, texty se načítají až při analýze
+    return render_template('study_new.html', materials=study_materials.topic_index())
 
-@app.route('/analyze', methods=['POST'])
-@login_required
-def analyze():
-    """Endpoint pro analýzu souboru nebo vybraného materiálu"""
-    start_time = datetime.utcnow()
+def save_study_session(user_id, subject, topic, duration, answered=0, correct=0, when=None):
+    """Uloží studijní session a započítá ji do statistik, rollupů a pokroku (bez commitu)"""
+    when = when or datetime.utcnow()
+    duration = max(1, duration)  # At least 1 minute
+    session_data = StudySession(
+        user_id=user_id,
+        topic=topic or 'Nespecifikované téma',
+        subject=subject,
+        duration_minutes=duration,
+        questions_answered=answered,
+        correct_answers=correct
+    )
     
-    try:
-        subject = None
-        topic = None
-        
-        if 'file' in request.files and request.files['file'].filename != '':
-            # Analýza nahraného souboru
-            file = request.files['file']
-            if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                
-                topic = filename.rsplit('.', 1)[0]  # Use filename as topic
-                
-                # Čtení obsahu podle typu souboru
-                if filename.lower().endswith('.pdf'):
-                    text = read_pdf_file(filepath)
-                elif filename.lower().endswith('.docx'):
-                    text = read_docx_file(filepath)
-                else:  # txt
-                    text = read_txt_file(filepath)
-                
-                # Smazání dočasného souboru
-                os.remove(filepath)
-                
-            else:
-                return jsonify({"error": "Nepodporovaný typ souboru"})
-                
-        elif 'subject' in request.form and 'topic' in request.form:
-            # Analýza vybraného materiálu z databáze
-            subject = request.form['subject']
-            topic = request.form['topic']
-            materials = load_study_materials()
-            
-            if subject in materials and topic in materials[subject]:
-                text = materials[subject][topic]
-            else:
-                return jsonify({"error": "Materiál nebyl nalezen"})
-        else:
-            return jsonify({"error": "Není vybrán soubor ani materiál"})
-        
-        # Analýza textu pomocí OpenAI
-        result = analyze_with_openai(text)
-        
-        # Calculate study duration
-        end_time = datetime.utcnow()
-        duration = int((end_time - start_time).total_seconds() / 60)  # in minutes
-        
-        # Save study session
-        session_data = StudySession(
-            user_id=current_user.id,
-            topic=topic or 'Nespecifikované téma',
+    stats = db.session.get(UserStats, user_id)
+    # Transakce začíná zápisem: souběžné úlohy se seřadí na zámku SQLite
+    # a nenarazí do sebe při povyšování čtecího zámku na zápisový
+    db.session.add(session_data)
+    db.session.flush()
+    if stats is None:
+        # Statistiky spočítané z historie už tuto session obsahují
+        UserStats.for_user(user_id)
+    else:
+        stats.record_session(duration, when)
+    DailyStudyRollup.record(
+        user_id,
+        when.date(),
+        subject,
+        minutes=duration,
+        sessions=1,
+        questions=answered,
+        correct=correct
+    )
+    
+    # Update user progress
+    if subject:
+        user_progress(user_id, subject).update_progress(duration, answered, correct)
+    
+    return session_data
+
+def user_progress(user_id, subject):
+    """Pokrok uživatele v předmětu (vytvoří se při prvním použití)"""
+    progress, _ = get_or_create(
+        UserProgress,
+        lambda: UserProgress(
+            user_id=user_id,
             subject=subject,
-            duration_minutes=max(1, duration),  # At least 1 minute
-            questions_answered=len(result.get('questions', [])),
-            materials_analyzed=json.dumps(result) if not result.get('error') else None
+            total_study_time=0,
+            sessions_count=0,
+            average_accuracy=0.0,
+            questions_answered=0,
+            correct_answers=0
+        ),
+        user_id=user_id,
+        subject=subject
+    )
+    return progress
+
+def is_valid_id(value):
+    """Celé číslo v rozsahu primárního klíče (bool ani obří čísla z JSONu nejsou ID)"""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value < 2 ** 63
+
+def extend_study_session(session_data, minutes, when):
+    """Přičte čas k existující session včetně statistik, rollupů a pokroku (bez commitu)"""
+    session_data.duration_minutes = StudySession.duration_minutes + minutes
+    UserStats.for_user(session_data.user_id).record_minutes(minutes, when)
+    DailyStudyRollup.record(session_data.user_id, when.date(), session_data.subject, minutes=minutes)
+    if session_data.subject:
+        user_progress(session_data.user_id, session_data.subject).record_answers(0, 0, minutes)
+
+def record_study_session(user_id, subject, topic, result, started_at):
+    """Uloží session analýzy, výsledek a z něj nové kartičky k opakování (bez commitu)"""
+    # Calculate study duration
+    end_time = datetime.utcnow()
+    duration = int((end_time - started_at).total_seconds() / 60)  # in minutes
+    
+    # Vygenerované otázky se započítají až po zodpovězení při opakování
+    session_data = save_study_session(user_id, subject, topic, duration, when=end_time)
+    if not result.get('error'):
+        # Stejné výsledky (např. téma z katalogu z cache) se uloží jen jednou
+        session_data.payload = AnalysisPayload.store(result)
+        Flashcard.add_from_result(user_id, session_data, subject, topic, result)
+    
+    return session_data
+
+def text_store_key(filename, digest):
+    return upload_key(digest, file_extension(filename), app.config['EXTRACTION_CHAR_BUDGET'])
+
+def stored_upload_text(filename, digest):
+    """Text dříve nahraného souboru se stejným obsahem a typem, jinak None"""
+    return text_store.get(text_store_key(filename, digest))
+
+def load_source_text(subject, topic, filename=None, data=None, digest=None):
+    """Vrátí text k analýze z nahraného souboru nebo z katalogu materiálů (None, pokud neexistuje)"""
+    if filename:
+        # Úlohy z doby před ukládáním hashe mají jen obsah souboru
+        digest = digest or hashlib.sha256(data or b'').hexdigest()
+        text = stored_upload_text(filename, digest)
+        if text is not None or data is None:
+            return text
+        started = time.perf_counter()
+        text = extract_text(
+            data,
+            filename,
+            char_budget=app.config['EXTRACTION_CHAR_BUDGET'],
+            max_workers=app.config['PDF_WORKERS']
         )
+        instrumentation.observe_extraction(file_extension(filename), time.perf_counter() - started, len(text))
+        text_store.set(text_store_key(filename, digest), text)
+        return text
+    return study_materials.get(subject, topic)
+
+def process_analysis_job(job):
+    """Zpracuje úlohu z fronty: extrakce textu, AI analýza a uložení session"""
+    result = catalogue_result(job.subject, job.topic, job.source_name)
+    if result is None:
+        text = job.source_text
+        if text is None:
+            text = load_source_text(job.subject, job.topic, job.source_name, job.source_data, job.source_hash)
+        if text is None and job.source_name:
+            return {"error": "Nahraný soubor už není k dispozici, nahrajte ho prosím znovu"}
+        if text is None:
+            return {"error": "Materiál nebyl nalezen"}
+        if job.source_data is not None:
+            # Obsah souboru už není potřeba; pro obnovení po restartu stačí text
+            job.source_text = text
+            job.source_data = None
+            db.session.commit()
         
-        db.session.add(session_data)
+        # Analýza textu pomocí OpenAI
+        result = analyze_with_openai(text)
+    
+    record_study_session(job.user_id, job.subject, job.topic, result, job.created_at)
+    db.session.commit()
+    
+    return result
+
+analysis_jobs = JobQueue(app, process_analysis_job)
+
+def read_analysis_request():
+    """Načte z formuláře nahraný soubor nebo vybraný materiál.
+    
+    Vrací (subject, topic, filename, data, digest), při neplatném vstupu vyhodí ValueError.
+    """
+    if 'file' in request.files and request.files['file'].filename != '':
+        # Analýza nahraného souboru; do extrakce textu je obsah v řádku úlohy
+        # (analysis_job.source_data), název souboru slouží jen jako téma a
+        # obsah se identifikuje hashem
+        file = request.files['file']
+        if not allowed_file(file.filename):
+            raise ValueError("Nepodporovaný typ souboru")
+        filename = secure_filename(file.filename) or file.filename
+        topic = filename.rsplit('.', 1)[0]  # Use filename as topic
+        data, digest = read_upload(file.stream)
+        return None, topic, filename, data, digest
+    
+    if 'subject' in request.form and 'topic' in request.form:
+        # Analýza vybraného materiálu z databáze
+        subject = request.form['subject']
+        topic = request.form['topic']
+        if (subject, topic) not in study_materials:
+            raise ValueError("Materiál nebyl nalezen")
+        return subject, topic, None, None, None
+    
+    raise ValueError("Není vybrán soubor ani materiál")
+
+def queue_full_response():
+    response = jsonify({"error": "Server je právě vytížený, zkuste to prosím za chvíli"})
+    response.headers['Retry-After'] = '10'
+    return response, 503
+
+@app.route('/analyze', methods=['POST'])
+@login_required
+def analyze():
+    """Zařadí soubor nebo vybraný materiál do fronty analýz a vrátí ID úlohy"""
+    try:
+        try:
+            subject, topic, filename, data, digest = read_analysis_request()
+        except ValueError as e:
+            return jsonify({"error": str(e)})
         
-        # Update user progress
-        if subject:
-            progress = UserProgress.query.filter_by(
-                user_id=current_user.id, 
-                subject=subject
-            ).first()
-            
-            if not progress:
-                progress = UserProgress(
-                    user_id=current_user.id,
-                    subject=subject
-                )
-                db.session.add(progress)
-            
-            progress.update_progress(duration, 0)  # We don't have accuracy yet
+        # Předpočítaná a už analyzovaná témata se vrací hned, bez fronty
+        result = catalogue_result(subject, topic, filename)
+        text = None
+        if result is None and not filename:
+            result = text_analyzer.cached(study_materials.get(subject, topic))
+        elif result is None:
+            text = stored_upload_text(filename, digest)
+            if text is not None:
+                # Stejný soubor už někdo nahrál: extrakce se přeskočí a do úlohy
+                # se místo obsahu souboru uloží text (úložiště ho může mezitím
+                # vyřadit); analýza může být i v cache
+                data = None
+                result = text_analyzer.cached(text)
+        if result is not None:
+            job = analysis_jobs.record_finished(current_user.id, subject, topic, result)
+            record_study_session(current_user.id, subject, topic, result, job.started_at)
+            db.session.commit()
+            return jsonify(job.to_dict())
         
-        db.session.commit()
+        try:
+            job = analysis_jobs.submit(
+                current_user.id, subject, topic, filename, data, source_hash=digest, source_text=text
+            )
+        except QueueFullError:
+            return queue_full_response()
         
-        return jsonify(result)
+        return jsonify(job.to_dict()), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({"error": f"Chyba serveru: {str(e)}"})
 
+def sse_event(event, data):
+    """Zformátuje jednu Server-Sent Event zprávu"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/analyze/stream', methods=['POST'])
+@login_required
+def analyze_stream():
+    """Analýza se streamováním výsledků přes Server-Sent Events"""
+    try:
+        subject, topic, filename, data, digest = read_analysis_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)})
+    
+    user_id = current_user.id
+    start_time = datetime.utcnow()
+    section_events = {'summary': 'summary', 'questions': 'question', 'flashcards': 'flashcard'}
+    
+    def analysis_events():
+        precomputed = catalogue_result(subject, topic, filename)
+        if precomputed is not None:
+            return result_events(precomputed)
+        text = load_source_text(subject, topic, filename, data, digest)
+        if text is None:
+            return None
+        return text_analyzer.stream(text)
+    
+    def generate():
+        try:
+            with analysis_jobs.slot():
+                yield sse_event('status', {"status": "running"})
+                
+                events = analysis_events()
+                if events is None:
+                    yield sse_event('error', {"error": "Materiál nebyl nalezen"})
+                    return
+                
+                for section, item in events:
+                    if section == 'done':
+                        result = item
+                    else:
+                        yield sse_event(section_events[section], item)
+                
+                # Finální výsledek se ukládá stejně jako u analýzy z fronty
+                record_study_session(user_id, subject, topic, result, start_time)
+                db.session.commit()
+                
+                if result.get('error'):
+                    yield sse_event('error', {"error": result['error']})
+                else:
+                    yield sse_event('done', result)
+        except QueueFullError:
+            yield sse_event('error', {"error": "Server je právě vytížený, zkuste to prosím za chvíli"})
+        except Exception as e:
+            db.session.rollback()
+            yield sse_event('error', {"error": f"Chyba serveru: {str(e)}"})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx nesmí odpověď bufferovat
+    return response
+
+@app.route('/analyze/jobs/<job_id>')
+@login_required
+def analysis_job_status(job_id):
+    """Stav úlohy analýzy, po dokončení včetně výsledku"""
+    job = db.session.get(AnalysisJob, job_id)
+    if job is None or job.user_id != current_user.id:
+        return jsonify({"error": "Úloha nebyla nalezena"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/analyze/cache-stats')
+@login_required
+def analysis_cache_stats():
+    """Statistiky cache výsledků analýzy"""
+    return jsonify(analysis_cache.stats())
+
 # Additional routes for new features
 @app.route('/analytics')
 @login_required
 def analytics():
     """Stránka se statistikami učení"""
-    return render_template('analytics_new.html')
+    stats = get_user_stats(current_user.id)
+    average_accuracy = db.session.query(db.func.avg(UserProgress.average_accuracy)).filter(
+        UserProgress.user_id == current_user.id, UserProgress.questions_answered > 0
+    ).scalar() or 0
+    return render_template('analytics_new.html', stats=stats, average_accuracy=average_accuracy)
+
+def conditional_json(data, last_modified):
+    """JSON odpověď s ETag a Last-Modified; při shodě vrátí 304 bez těla"""
+    response = jsonify(data)
+    response.set_etag(hashlib.sha1(response.get_data()).hexdigest())
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # prohlížeč se vždy zeptá, ale levně (304)
+    return response.make_conditional(request)
+
+@app.route('/api/analytics/study-time')
+@login_required
+def analytics_study_time():
+    """Čas studia po dnech nebo týdnech (?period=day|week&from=&to=)"""
+    try:
+        start, end = parse_date_range(request.args)
+        series = study_time_series(current_user.id, start, end, request.args.get('period', 'day'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return conditional_json({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'period': request.args.get('period', 'day'),
+        'series': series
+    }, rollups_last_modified(current_user.id, start, end))
+
+@app.route('/api/analytics/subjects')
+@login_required
+def analytics_subjects():
+    """Minuty, počet relací a úspěšnost podle předmětů (?from=&to=)"""
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return conditional_json({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'subjects': subject_breakdown(current_user.id, start, end)
+    }, rollups_last_modified(current_user.id, start, end))
 
 @app.route('/notes')
 @login_required
@@ -312,28 +709,96 @@ def notes():
     search = request.args.get('search', '')
     tag = request.args.get('tag', '')
     
-    query = Note.query.filter_by(user_id=current_user.id)
-    
-    if search:
-        query = query.filter(
-            Note.title.contains(search) | Note.content.contains(search)
-        )
-    
-    if tag:
-        query = query.filter(Note.tags.contains(tag))
-    
-    notes_list = query.order_by(Note.updated_at.desc()).all()
+    try:
+        page = notes_list_page(current_user.id, search, tag, request.args.get('cursor'))
+    except ValueError:
+        page = notes_list_page(current_user.id, search, tag)
     
-    # Get all tags for filter
-    all_tags = set()
-    for note in Note.query.filter_by(user_id=current_user.id).all():
-        all_tags.update(note.tag_list)
+    # Tags for the filter sidebar with their note counts (one indexed query)
+    all_tags = Tag.counts_for_user(current_user.id)
     
     return render_template('notes_new.html', 
-                         notes=notes_list, 
+                         notes=page.items, 
+                         next_cursor=page.next_cursor,
                          search=search, 
                          selected_tag=tag,
-                         all_tags=sorted(all_tags))
+                         all_tags=all_tags)
+
+@app.route('/api/notes')
+@login_required
+def api_notes():
+    """Poznámky po stránkách pro nekonečné scrollování (?cursor=&limit=&search=&tag=)"""
+    try:
+        page = notes_list_page(
+            current_user.id,
+            request.args.get('search', ''),
+            request.args.get('tag', ''),
+            request.args.get('cursor'),
+            api_page_size(app.config['NOTES_PER_PAGE'])
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return jsonify({
+        'notes': [note_list_item(note, preview, snippet) for note, preview, snippet in page.items],
+        'next_cursor': page.next_cursor
+    })
+
+def related_note_items(hits):
+    """Výsledky z indexu poznámek jako JSON (bez obsahu poznámek)"""
+    notes = {note.id: note for note in Note.query.options(db.defer(Note.content)).filter(
+        Note.id.in_([note_id for note_id, _ in hits])
+    )}
+    return [{
+        'id': note_id,
+        'title': notes[note_id].title,
+        'subject': notes[note_id].subject,
+        'score': round(score, 3),
+        'url': url_for('edit_note', note_id=note_id),
+    } for note_id, score in hits if note_id in notes]
+
+def related_topic_items(hits):
+    return [{'subject': subject, 'topic': topic, 'score': round(score, 3)} for (subject, topic), score in hits]
+
+@app.route('/api/notes/<int:note_id>/related')
+@login_required
+def api_related_notes(note_id):
+    """Poznámky podobné dané poznámce (?limit=)"""
+    note = db.session.get(Note, note_id)
+    if note is None or note.user_id != current_user.id:
+        return jsonify({"error": "Poznámka nebyla nalezena"}), 404
+    return jsonify({'notes': related_note_items(note_embeddings.related(note, api_page_size(5)))})
+
+@app.route('/api/study-sessions/<int:session_id>/related-topics')
+@login_required
+def api_related_topics(session_id):
+    """Témata z katalogu související s látkou studijní relace (?limit=)"""
+    session_data = db.session.get(StudySession, session_id)
+    if session_data is None or session_data.user_id != current_user.id:
+        return jsonify({"error": "Studijní relace nebyla nalezena"}), 404
+    
+    # Dotazem je téma, jeho text z katalogu a shrnutí z analýzy
+    parts = [session_data.subject or '', session_data.topic]
+    parts.append(study_materials.get(session_data.subject, session_data.topic) or '')
+    result = session_data.analysis_result or {}
+    parts.extend(point for point in result.get('summary') or [] if isinstance(point, str))
+    hits = topic_embeddings.search(
+        '\n'.join(parts), api_page_size(5), exclude={(session_data.subject, session_data.topic)}
+    )
+    return jsonify({'topics': related_topic_items(hits)})
+
+@app.route('/api/semantic-search')
+@login_required
+def api_semantic_search():
+    """Sémantické hledání v poznámkách uživatele a tématech katalogu (?q=&limit=)"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Zadejte hledaný text"}), 400
+    limit = api_page_size(10)
+    return jsonify({
+        'notes': related_note_items(note_embeddings.search(current_user.id, query, limit)),
+        'topics': related_topic_items(topic_embeddings.search(query, limit)),
+    })
 
 @app.route('/notes/new', methods=['GET', 'POST'])
 @login_required
@@ -342,20 +807,21 @@ def new_note():
     form = NoteForm()
     
     # Populate subject choices from study materials
-    materials = load_study_materials()
-    form.subject.choices = [('', 'Bez předmětu')] + [(subject, subject) for subject in materials.keys()]
+    form.subject.choices = study_materials.subject_choices()
     
     if form.validate_on_submit():
         note = Note(
             user_id=current_user.id,
             title=form.title.data,
             content=form.content.data,
-            subject=form.subject.data if form.subject.data else None,
-            tags=form.tags.data
+            subject=form.subject.data if form.subject.data else None
         )
-        
+        stats = UserStats.for_user(current_user.id)
         db.session.add(note)
+        note.set_tags(form.tags.data)
+        stats.record_note(1)
         db.session.commit()
+        note_embeddings.update(note)
         
         flash('Poznámka byla úspěšně vytvořena!', 'success')
         return redirect(url_for('notes'))
@@ -376,17 +842,17 @@ def edit_note(note_id):
     form = NoteForm(obj=note)
     
     # Populate subject choices
-    materials = load_study_materials()
-    form.subject.choices = [('', 'Bez předmětu')] + [(subject, subject) for subject in materials.keys()]
+    form.subject.choices = study_materials.subject_choices()
     
     if form.validate_on_submit():
         note.title = form.title.data
         note.content = form.content.data
         note.subject = form.subject.data if form.subject.data else None
-        note.tags = form.tags.data
+        note.set_tags(form.tags.data)
         note.updated_at = datetime.utcnow()
         
         db.session.commit()
+        note_embeddings.update(note)
         
         flash('Poznámka byla úspěšně aktualizována!', 'success')
         return redirect(url_for('notes'))
@@ -403,21 +869,208 @@ def delete_note(note_id):
         flash('Nemáte oprávnění ke smazání této poznámky', 'error')
         return redirect(url_for('notes'))
     
+    note.set_tags(None)  # Decrement tag counts
+    UserStats.for_user(current_user.id).record_note(-1)
     db.session.delete(note)
     db.session.commit()
+    note_embeddings.remove(note_id)
     
     flash('Poznámka byla smazána', 'info')
     return redirect(url_for('notes'))
 
+@app.route('/review')
+@login_required
+def review():
+    """Opakování kartiček a otázek, které jsou na řadě"""
+    due_count = Flashcard.due_query(current_user.id).count()
+    total_count = Flashcard.query.filter_by(user_id=current_user.id).count()
+    return render_template('review_new.html', due_count=due_count, total_count=total_count)
+
+@app.route('/api/reviews/due')
+@login_required
+def api_due_cards():
+    """Kartičky na řadě k opakování, nejdéle čekající první (?limit=)"""
+    cards = Flashcard.due(current_user.id, api_page_size(20))
+    return jsonify({
+        'cards': [card.to_dict() for card in cards],
+        'due_count': Flashcard.due_query(current_user.id).count()
+    })
+
+@app.route('/api/reviews', methods=['POST'])
+@login_required
+def api_submit_reviews():
+    """Uloží dávku odpovědí: naplánuje další opakování a započítá úspěšnost.
+    
+    Tělo: {"answers": [{"card_id": 1, "grade": "good"}], "duration_seconds": 300,
+    "session_id": 12}; grade je again/hard/good/easy nebo číslo 0–5 a
+    duration_seconds je doba od začátku opakování (nejvýš
+    REVIEW_SESSION_MAX_HOURS). Celé opakování je jedna studijní session:
+    vytvoří se s první dávkou a její ``session_id`` posílá klient s dalšími
+    dávkami; cizí nebo starší session se nepokračuje, založí se nová.
+    Úspěšnost se započítá do předmětů kartiček.
+    Všechno se uloží v jedné transakci.
+    """
+    data = request.get_json(silent=True) or {}
+    answers = data.get('answers')
+    if not isinstance(answers, list) or not answers:
+        return jsonify({"error": "Chybí odpovědi"}), 400
+    if len(answers) > app.config['API_MAX_PAGE_SIZE']:
+        return jsonify({"error": "Příliš mnoho odpovědí najednou"}), 400
+    try:
+        grades = {int(answer['card_id']): srs.parse_grade(answer['grade']) for answer in answers}
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Neplatná odpověď"}), 400
+    if not all(is_valid_id(card_id) for card_id in grades):
+        return jsonify({"error": "Neplatná odpověď"}), 400
+    max_session = timedelta(hours=app.config['REVIEW_SESSION_MAX_HOURS'])
+    duration_seconds = data.get('duration_seconds')
+    if not isinstance(duration_seconds, (int, float)) or not math.isfinite(duration_seconds) or duration_seconds < 0:
+        duration_seconds = 0
+    duration_seconds = min(duration_seconds, max_session.total_seconds())
+    session_id = data.get('session_id')
+    
+    try:
+        cards = Flashcard.query.filter(
+            Flashcard.user_id == current_user.id, Flashcard.id.in_(list(grades))
+        ).all()
+        if not cards:
+            return jsonify({"error": "Kartičky nebyly nalezeny"}), 404
+        
+        now = datetime.utcnow()
+        by_subject = {}
+        for card in cards:
+            grade = grades[card.id]
+            card.review(grade, now)
+            group = by_subject.setdefault(card.subject, {'topics': set(), 'answered': 0, 'correct': 0})
+            group['topics'].add(card.topic)
+            group['answered'] += 1
+            group['correct'] += srs.is_correct(grade)
+        
+        study_session = None
+        if is_valid_id(session_id):
+            study_session = db.session.get(StudySession, session_id)
+            # Jen vlastní session opakování (má odpovědi, nemá výsledek analýzy) z posledních hodin
+            if study_session is not None and (
+                study_session.user_id != current_user.id
+                or study_session.payload_id
+                or not study_session.questions_answered
+                or study_session.created_at < now - max_session
+            ):
+                study_session = None
+        
+        minutes = max(1, round(duration_seconds / 60))
+        if study_session is None:
+            # Session opakování patří předmětu s nejvíce odpověďmi v první dávce
+            subject = max(by_subject, key=lambda name: by_subject[name]['answered'])
+            topics = set().union(*(group['topics'] for group in by_subject.values()))
+            study_session = save_study_session(
+                current_user.id,
+                subject,
+                topics.pop() if len(topics) == 1 else 'Opakování kartiček',
+                minutes,
+                when=now
+            )
+        elif minutes > study_session.duration_minutes:
+            extend_study_session(study_session, minutes - study_session.duration_minutes, now)
+        
+        correct = sum(group['correct'] for group in by_subject.values())
+        study_session.questions_answered = StudySession.questions_answered + len(cards)
+        study_session.correct_answers = StudySession.correct_answers + correct
+        # Odpovědi se počítají do předmětů kartiček, ne jen do předmětu session
+        for subject, group in by_subject.items():
+            DailyStudyRollup.record(
+                current_user.id, now.date(), subject, questions=group['answered'], correct=group['correct']
+            )
+            if subject:
+                user_progress(current_user.id, subject).record_answers(group['answered'], group['correct'])
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Chyba serveru: {str(e)}"}), 500
+    
+    return jsonify({
+        'reviewed': len(cards),
+        'correct': correct,
+        'cards': [{'id': card.id, 'due_at': card.due_at.isoformat(), 'interval_days': card.interval_days} for card in cards],
+        'session_id': study_session.id,
+        'due_count': Flashcard.due_query(current_user.id).count()
+    })
+
 @app.route('/settings')
 @login_required
 def settings():
     """Stránka s nastaveními"""
     return render_template('settings_new.html')
 
+def init_database():
+    """Provede čekající migrace databáze a vrátí jejich názvy"""
+    return migrations.upgrade()
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Provede čekající migrace databáze"""
+    applied = init_database()
+    if applied:
+        click.echo('Provedené migrace: ' + ', '.join(applied))
+    else:
+        click.echo('Databáze je aktuální')
+
+@app.cli.command('db-status')
+def db_status_command():
+    """Vypíše migrace, které ještě nebyly provedeny"""
+    for version, name in migrations.pending_migrations():
+        click.echo(f'{version:04d} {name}')
+
+@app.cli.command('precompute-catalogue')
+@click.option('--concurrency', default=None, type=int, help='Počet souběžných analýz (výchozí ANALYSIS_CONCURRENCY)')
+@click.option('--retries', default=None, type=int, help='Počet opakování volání OpenAI (výchozí OPENAI_MAX_RETRIES)')
+@click.option('--backoff', default=None, type=float, help='Čekání před prvním opakováním v sekundách (výchozí OPENAI_RETRY_BACKOFF)')
+@click.option('--subject', 'subjects', multiple=True, help='Jen vybrané předměty (lze opakovat)')
+@click.option('--force', is_flag=True, help='Analyzovat znovu i nezměněná témata')
+@click.option('--prune', is_flag=True, help='Smazat analýzy témat, která už v katalogu nejsou')
+def precompute_catalogue_command(concurrency, retries, backoff, subjects, force, prune):
+    """Předpočítá analýzy všech témat ze study_materials.json"""
+    init_database()
+    # Opakování i záložní modely řeší TextAnalyzer, volby jen mění jeho nastavení pro tento běh
+    if retries is not None:
+        text_analyzer.max_retries = retries
+    if backoff is not None:
+        text_analyzer.backoff = backoff
+    
+    def progress(done, total, subject, topic, result, seconds):
+        status = f"chyba: {result['error']}" if result.get('error') else 'hotovo'
+        click.echo(f'[{done}/{total}] {subject} / {topic}: {status} ({seconds:.1f} s)')
+    
+    summary = precompute_catalogue(
+        study_materials, analyze_with_openai, text_analyzer.model,
+        concurrency=concurrency or app.config['ANALYSIS_CONCURRENCY'],
+        subjects=subjects, force=force, progress=progress
+    )
+    if prune:
+        click.echo(f'Smazáno analýz odebraných témat: {prune_removed(study_materials)}')
+    
+    rate = summary['analyzed'] / summary['seconds'] * 60 if summary['seconds'] else 0
+    click.echo(
+        f"Analyzováno {summary['analyzed']}, přeskočeno {summary['skipped']}, chyby {summary['failed']} "
+        f"z {summary['total']} témat za {summary['seconds']:.1f} s ({rate:.1f} témat/min)"
+    )
+    if summary['failed']:
+        raise SystemExit(1)
+
+@app.cli.command('reindex-notes')
+@click.option('--full', is_flag=True, help='Přepočítat vektory všech poznámek')
+def reindex_notes_command(full):
+    """Dorovná index vektorů poznámek s databází"""
+    started = time.perf_counter()
+    if full:
+        for note_id in list(note_embeddings.index.versions()):
+            note_embeddings.index.remove(note_id)
+    updated, removed = note_embeddings.sync()
+    click.echo(f'Aktualizováno {updated}, odebráno {removed} poznámek za {time.perf_counter() - started:.1f} s')
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_database()
         
         # Create demo user if no users exist
         if User.query.count() == 0:
@@ -426,5 +1079,9 @@ if __name__ == '__main__':
             db.session.add(demo_user)
             db.session.commit()
             print('Demo uživatel byl vytvořen: demo / demo123')
+        
+        # Dokončení analýz přerušených restartem (jinak až při prvním requestu)
+        analysis_jobs.purge_finished()
+        analysis_jobs.resume_pending()
     
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""Porovnání dvou výsledků benchmarku.
+
+    python -m benchmarks.compare benchmarks/results/stary.json benchmarks/results/novy.json
+
+Vypíše změnu p50/p95/p99 a počtu dotazů pro každý scénář; s ``--fail-above``
+skončí chybou, pokud se p95 některého scénáře zhoršilo o víc procent.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        results = json.load(f)
+    return {**results.get('routes', {}), **results.get('extractors', {})}, results.get('meta', {})
+
+
+def change(old, new):
+    """Relativní změna v procentech (None, pokud ji nelze spočítat)"""
+    if old is None or new is None or old == 0:
+        return None
+    return (new - old) / old * 100
+
+
+def compare(baseline, current):
+    """Vrátí {scénář: {metrika: (stará, nová, změna %)}} pro scénáře v obou bězích"""
+    rows = {}
+    for name in baseline.keys() & current.keys():
+        rows[name] = {
+            metric: (baseline[name].get(metric), current[name].get(metric),
+                     change(baseline[name].get(metric), current[name].get(metric)))
+            for metric in METRICS
+        }
+    return dict(sorted(rows.items()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Porovnání dvou běhů benchmarku')
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--fail-above', type=float, metavar='PROCENT',
+                        help='návratový kód 1, pokud p95 vzroste o víc procent')
+    args = parser.parse_args(argv)
+
+    baseline, baseline_meta = load(args.baseline)
+    current, current_meta = load(args.current)
+    rows = compare(baseline, current)
+    print(f"{baseline_meta.get('commit')} -> {current_meta.get('commit')}")
+    print(f"{'scénář':<22}" + ''.join(f'{metric:>26}' for metric in METRICS))
+    regressions = []
+    for name, metrics in rows.items():
+        cells = []
+        for metric in METRICS:
+            old, new, pct = metrics[metric]
+            pct_text = '' if pct is None else f' ({pct:+.0f} %)'
+            cells.append(f'{_fmt(old)} -> {_fmt(new)}{pct_text}'.rjust(26))
+        print(f'{name:<22}' + ''.join(cells))
+        pct = metrics['p95_ms'][2]
+        if args.fail_above is not None and pct is not None and pct > args.fail_above:
+            regressions.append(name)
+    if regressions:
+        print(f"Zhoršení p95 nad {args.fail_above} %: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+if __name__ == '__main__':
+    sys.exit(main())
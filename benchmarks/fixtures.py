@@ -0,0 +1,141 @@
+"""Syntetická data a dokumenty pro benchmarky."""
+import io
+import random
+from datetime import datetime, timedelta
+
+import bcrypt
+
+from models import db, User, StudySession, Note, UserStats, backfill_note_tags, backfill_daily_rollups
+
+BENCH_PASSWORD = 'bench123'
+
+WORDS = (
+    'buňka mitochondrie fotosyntéza enzym bílkovina integrál derivace limita funkce rovnice '
+    'revoluce renesance baroko republika válka atom molekula reakce oxidace energie '
+    'gramatika syntax sloh literatura básník vektor matice pravděpodobnost statistika algoritmus'
+).split()
+SUBJECTS = ['Biologie', 'Matematika', 'Dějepis', 'Chemie', 'Fyzika', 'Čeština']
+TAGS = ['opakování', 'test', 'maturita', 'důležité', 'vzorce', 'definice', 'přednáška', 'cvičení']
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def paragraph(rng, sentences=6):
+    return ' '.join(sentence(rng) for _ in range(sentences))
+
+
+def seed_database(users=20, sessions_per_user=200, notes_per_user=100, days=365, seed=1):
+    """Naplní prázdnou databázi uživateli ``bench1..N``, relacemi a poznámkami.
+
+    Všichni uživatelé mají heslo BENCH_PASSWORD. Souhrny, tagy a statistiky
+    se dopočítají stejnými backfilly jako při upgradu aplikace.
+    Volá se v app contextu po ``init_database()``.
+    """
+    rng = random.Random(seed)
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    now = datetime.utcnow()
+
+    accounts = [
+        User(username=f'bench{i}', email=f'bench{i}@studymate.test', password_hash=password_hash)
+        for i in range(1, users + 1)
+    ]
+    db.session.add_all(accounts)
+    db.session.commit()
+
+    for user in accounts:
+        for _ in range(sessions_per_user):
+            questions = rng.randint(0, 10)
+            db.session.add(StudySession(
+                user_id=user.id,
+                topic=rng.choice(WORDS).capitalize(),
+                subject=rng.choice(SUBJECTS + [None]),
+                duration_minutes=rng.randint(1, 90),
+                questions_answered=questions,
+                correct_answers=rng.randint(0, questions),
+                created_at=now - timedelta(days=rng.randint(0, days - 1), minutes=rng.randint(0, 1439))
+            ))
+        for _ in range(notes_per_user):
+            updated = now - timedelta(days=rng.randint(0, days - 1), minutes=rng.randint(0, 1439))
+            db.session.add(Note(
+                user_id=user.id,
+                title=sentence(rng, rng.randint(2, 6)).rstrip('.'),
+                content='\n\n'.join(paragraph(rng) for _ in range(rng.randint(1, 4))),
+                tags=', '.join(rng.sample(TAGS, rng.randint(0, 3))),
+                subject=rng.choice(SUBJECTS + [None]),
+                created_at=updated,
+                updated_at=updated
+            ))
+        db.session.commit()
+
+    backfill_note_tags()
+    backfill_daily_rollups()
+    for user in accounts:
+        UserStats.rebuild(user.id)
+    db.session.commit()
+    return [user.username for user in accounts]
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages=50, lines_per_page=40, seed=1):
+    """Vícestránkové PDF s textem (Helvetica, jen ASCII kvůli standardnímu kódování)"""
+    rng = random.Random(seed)
+    ascii_words = [word.encode('ascii', 'ignore').decode() or 'text' for word in WORDS]
+    bodies = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+    }
+    kids = []
+    for index in range(pages):
+        page_id = 4 + 2 * index
+        content_id = page_id + 1
+        kids.append(f'{page_id} 0 R')
+        lines = [
+            ' '.join(rng.choice(ascii_words) for _ in range(10))
+            for _ in range(lines_per_page)
+        ]
+        stream = ('BT /F1 10 Tf 14 TL 50 780 Td '
+                  + ' '.join(f'({_pdf_escape(line)}) Tj T*' for line in lines)
+                  + ' ET').encode('latin-1')
+        bodies[page_id] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            f'/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode()
+        bodies[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+    bodies[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {pages} >>'.encode()
+
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = {}
+    for number in sorted(bodies):
+        offsets[number] = out.tell()
+        out.write(f'{number} 0 obj\n'.encode() + bodies[number] + b'\nendobj\n')
+    xref = out.tell()
+    out.write(f'xref\n0 {len(bodies) + 1}\n0000000000 65535 f \n'.encode())
+    for number in sorted(bodies):
+        out.write(f'{offsets[number]:010d} 00000 n \n'.encode())
+    out.write(f'trailer\n<< /Size {len(bodies) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode())
+    return out.getvalue()
+
+
+def make_docx(paragraphs=500, seed=1):
+    """DOCX s ``paragraphs`` odstavci textu"""
+    from docx import Document
+
+    rng = random.Random(seed)
+    document = Document()
+    for _ in range(paragraphs):
+        document.add_paragraph(paragraph(rng))
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_txt(paragraphs=5, seed=None):
+    """Krátký text; bez ``seed`` je pokaždé jiný, takže se mine cache analýzy"""
+    rng = random.Random(seed)
+    return '\n\n'.join(paragraph(rng) for _ in range(paragraphs)).encode('utf-8')
@@ -0,0 +1,85 @@
+"""Benchmark extrakce textu z PDF: postupně v jednom procesu proti poolu procesů.
+
+Pro každou velikost syntetického PDF změří extract_text s jedním procesem
+(``max_workers=1``) a s ``--workers`` procesy, bez limitu znaků i s
+limitem ``--char-budget`` jako v aplikaci, a vypíše zrychlení. Pool procesů
+se před měřením zahřeje, jeho spuštění se do latencí nepočítá.
+
+Použití z kořene repozitáře:
+
+    python -m benchmarks.pdf_extraction --pages 50 200 1000 --workers 4
+"""
+import argparse
+import json
+import os
+import time
+from datetime import datetime
+
+from benchmarks import fixtures
+from benchmarks.run import RESULTS_DIR, git_commit, summarize
+from extractors import PDF_MIN_PAGES_PER_WORKER, extract_text
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[50, 200, 1000], help='velikosti PDF ve stránkách')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='procesů pro paralelní extrakci')
+    parser.add_argument('--char-budget', type=int, default=100000, help='limit znaků (EXTRACTION_CHAR_BUDGET)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='cesta k JSON výsledku (výchozí benchmarks/results/pdf-<čas>.json)')
+    return parser.parse_args(argv)
+
+
+def timed_extraction(data, char_budget, max_workers, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = extract_text(data, 'bench.pdf', char_budget=char_budget, max_workers=max_workers)
+        latencies.append(time.perf_counter() - started)
+    return latencies, len(text)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Zahřátí: pool procesů se spustí jen jednou za běh aplikace
+    warmup = fixtures.make_pdf(pages=2 * PDF_MIN_PAGES_PER_WORKER * args.workers)
+    extract_text(warmup, 'bench.pdf', max_workers=args.workers)
+
+    scenarios = {}
+    for pages in args.pages:
+        data = fixtures.make_pdf(pages=pages)
+        for char_budget in (None, args.char_budget):
+            row = {'pages': pages, 'size_bytes': len(data), 'char_budget': char_budget}
+            for label, workers in (('sequential', 1), ('parallel', args.workers)):
+                latencies, chars = timed_extraction(data, char_budget, workers, args.repeat)
+                row[label] = summarize(latencies)
+                row['chars'] = chars
+            row['speedup'] = round(row['sequential']['p50_ms'] / row['parallel']['p50_ms'], 2)
+            scenarios[f"pdf_{pages}p_{'budget' if char_budget else 'full'}"] = row
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': git_commit(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'scenarios': scenarios,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, 'pdf-' + datetime.utcnow().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print(f"{os.cpu_count()} CPU, paralelně {args.workers} procesů")
+    print(f"{'scénář':<24} {'znaků':>9} {'1 proces ms':>12} {'pool ms':>9} {'zrychlení':>10}")
+    for name, row in scenarios.items():
+        print(f"{name:<24} {row['chars']:>9} {row['sequential']['p50_ms']:>12} "
+              f"{row['parallel']['p50_ms']:>9} {row['speedup']:>9}x")
+    print(f'Výsledky uloženy do {output}')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,473 @@
+"""Zátěžový benchmark hlavních rout StudyMate.
+
+Spustí aplikaci nad dočasnou databází se syntetickými daty, místo OpenAI
+použije lokální stub se zadanou latencí a každou routu zatíží souběžnými
+klienty. Pro každou routu změří p50/p95/p99 latence, propustnost, chyby
+a počet SQL dotazů na request; zvlášť měří extrakci textu z velkého PDF
+a DOCX. Výsledek se uloží jako JSON pro porovnání běhů
+(``python -m benchmarks.compare``).
+
+Použití z kořene repozitáře:
+
+    python -m benchmarks.run --users 20 --requests 200 --concurrency 8
+"""
+import argparse
+import http.cookiejar
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+from benchmarks import fixtures
+from benchmarks.stub_openai import StubOpenAIServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def counter_totals(counter, label):
+    """Součty čítače z instrumentation podle jednoho popisku"""
+    totals = defaultdict(int)
+    for _, labels, _, value in counter.samples():
+        totals[dict(labels).get(label)] += value
+    return dict(totals)
+
+
+def percentile(sorted_values, q):
+    """Percentil s lineární interpolací (hodnoty musí být seřazené)"""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(latencies, errors=0, elapsed=None, queries=None):
+    """Souhrn latencí v milisekundách"""
+    values = sorted(latencies)
+    summary = {
+        'requests': len(values) + errors,
+        'errors': errors,
+        'p50_ms': _ms(percentile(values, 0.50)),
+        'p95_ms': _ms(percentile(values, 0.95)),
+        'p99_ms': _ms(percentile(values, 0.99)),
+        'mean_ms': _ms(sum(values) / len(values)) if values else None,
+        'max_ms': _ms(values[-1]) if values else None,
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(values) / elapsed, 2)
+    if queries is not None:
+        summary['queries_per_request'] = round(sum(queries) / len(queries), 2) if queries else None
+        summary['max_queries'] = max(queries) if queries else None
+    return summary
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+class QueryCounter:
+    """Počítá SQL dotazy na request podle hlavičky X-Bench-Scenario.
+
+    Dotazy mimo request (fronta analýz) se počítají zvlášť jako ``background``.
+    """
+
+    HEADER = 'X-Bench-Scenario'
+
+    def __init__(self):
+        self.by_scenario = defaultdict(list)
+        self.background = 0
+        self._lock = threading.Lock()
+
+    def install(self, app, engine):
+        from flask import g, has_request_context, request
+        from sqlalchemy import event
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def count_query(*args):
+            if has_request_context() and 'bench_queries' in g:
+                g.bench_queries += 1
+            else:
+                with self._lock:
+                    self.background += 1
+
+        @app.before_request
+        def start_counting():
+            g.bench_scenario = request.headers.get(self.HEADER)
+            g.bench_queries = 0
+
+        @app.teardown_request
+        def finish_counting(exc):
+            scenario = g.pop('bench_scenario', None)
+            queries = g.pop('bench_queries', 0)
+            if scenario:
+                with self._lock:
+                    self.by_scenario[scenario].append(queries)
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """HTTP klient s vlastními cookies (jedna přihlášená relace)"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect()
+        )
+
+    def request(self, method, path, scenario=None, form=None, files=None, timeout=120):
+        """Vrátí (status, tělo odpovědi); přesměrování se nenásledují"""
+        headers = {}
+        data = None
+        if files:
+            boundary = uuid.uuid4().hex
+            data = _multipart(boundary, form or {}, files)
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode('utf-8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        if scenario:
+            headers[QueryCounter.HEADER] = scenario
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=timeout) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def login(self, username, password, scenario=None):
+        status, _ = self.request('POST', '/login', scenario, form={'username': username, 'password': password})
+        return status == 302
+
+
+def _multipart(boundary, form, files):
+    parts = []
+    for name, value in form.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode('utf-8')
+        )
+    for name, (filename, content) in files.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'.encode('utf-8') + content + b'\r\n'
+        )
+    parts.append(f'--{boundary}--\r\n'.encode('utf-8'))
+    return b''.join(parts)
+
+
+class Scenario:
+    """Jedna měřená operace: ``call(client, rng)`` vrací True při úspěchu"""
+
+    def __init__(self, name, call, requests, login=True):
+        self.name = name
+        self.call = call
+        self.requests = requests
+        self.login = login
+
+
+def run_scenario(scenario, base_url, usernames, concurrency):
+    """Provede ``scenario.requests`` volání z ``concurrency`` souběžných klientů"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(scenario.requests))
+    lock = threading.Lock()
+
+    # Přihlášení klientů se do měření nepočítá
+    clients = [Client(base_url) for _ in range(concurrency)]
+    if scenario.login:
+        for index, client in enumerate(clients):
+            client.login(usernames[index % len(usernames)], fixtures.BENCH_PASSWORD)
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(index)
+        client = clients[index]
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            started = time.perf_counter()
+            try:
+                ok = scenario.call(client, rng)
+            except Exception:
+                ok = False
+            duration = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(duration)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def build_scenarios(args, usernames):
+    def login(client, rng):
+        return Client(client.base_url).login(rng.choice(usernames), fixtures.BENCH_PASSWORD, 'login')
+
+    def dashboard(client, rng):
+        return client.request('GET', '/dashboard', 'dashboard')[0] == 200
+
+    def notes(client, rng):
+        return client.request('GET', '/notes', 'notes')[0] == 200
+
+    def notes_api(client, rng):
+        # Scrollování přes 1 až 5 stránek; latence je za celé scrollování, dotazy na request
+        cursor = None
+        for _ in range(rng.randint(1, 5)):
+            query = f'?cursor={urllib.parse.quote(cursor)}' if cursor else ''
+            status, body = client.request('GET', f'/api/notes{query}', 'notes_api')
+            if status != 200:
+                return False
+            cursor = json.loads(body)['next_cursor']
+            if not cursor:
+                break
+        return True
+
+    def notes_search(client, rng):
+        query = urllib.parse.quote(rng.choice(fixtures.WORDS))
+        return client.request('GET', f'/notes?search={query}', 'notes_search')[0] == 200
+
+    def analytics_api(client, rng):
+        return client.request('GET', '/api/analytics/study-time?period=week', 'analytics_study_time')[0] == 200
+
+    def analyze(client, rng):
+        status, body = client.request(
+            'POST', '/analyze', 'analyze',
+            files={'file': ('bench.txt', fixtures.make_txt())}
+        )
+        return status == 202
+
+    def analyze_stream(client, rng):
+        status, body = client.request(
+            'POST', '/analyze/stream', 'analyze_stream',
+            files={'file': ('bench.txt', fixtures.make_txt())}
+        )
+        return status == 200 and b'event: done' in body
+
+    return [
+        Scenario('login', login, args.requests, login=False),
+        Scenario('dashboard', dashboard, args.requests),
+        Scenario('notes', notes, args.requests),
+        Scenario('notes_api', notes_api, args.requests),
+        Scenario('notes_search', notes_search, args.requests),
+        Scenario('analytics_study_time', analytics_api, args.requests),
+        Scenario('analyze', analyze, args.analyze_requests),
+        Scenario('analyze_stream', analyze_stream, args.analyze_requests),
+    ]
+
+
+def wait_for_jobs(timeout):
+    """Počká na dokončení úloh analýzy a vrátí jejich latence (od zařazení do dokončení)"""
+    from models import db, AnalysisJob
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db.session.expire_all()
+        if not AnalysisJob.query.filter(AnalysisJob.status.in_(['queued', 'running'])).count():
+            break
+        time.sleep(0.2)
+    jobs = AnalysisJob.query.all()
+    latencies = [
+        (job.finished_at - job.created_at).total_seconds()
+        for job in jobs if job.status == 'done' and job.finished_at
+    ]
+    errors = sum(1 for job in jobs if job.status != 'done')
+    return latencies, errors
+
+
+def bench_extractors(args):
+    from extractors import extract_text
+
+    documents = {
+        'extract_pdf': ('bench.pdf', fixtures.make_pdf(pages=args.pdf_pages)),
+        'extract_docx': ('bench.docx', fixtures.make_docx(paragraphs=args.docx_paragraphs)),
+    }
+    results = {}
+    for name, (filename, data) in documents.items():
+        latencies = []
+        chars = 0
+        for _ in range(args.extract_repeat):
+            started = time.perf_counter()
+            text = extract_text(data, filename, char_budget=args.char_budget, max_workers=args.pdf_workers)
+            latencies.append(time.perf_counter() - started)
+            chars = len(text)
+        results[name] = dict(summarize(latencies), size_bytes=len(data), chars=chars)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results):
+    print(f"{'scénář':<22}{'req':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'dotazy':>8}")
+    for name, row in {**results['routes'], **results['extractors']}.items():
+        print(
+            f"{name:<22}{row['requests']:>6}{row['errors']:>5}"
+            f"{_fmt(row['p50_ms']):>10}{_fmt(row['p95_ms']):>10}{_fmt(row['p99_ms']):>10}"
+            f"{_fmt(row.get('throughput_rps')):>9}{_fmt(row.get('queries_per_request')):>8}"
+        )
+
+
+def _fmt(value):
+    return '-' if value is None else f'{value:.1f}'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark rout StudyMate')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--sessions', type=int, default=200, help='studijních relací na uživatele')
+    parser.add_argument('--notes', type=int, default=100, help='poznámek na uživatele')
+    parser.add_argument('--requests', type=int, default=200, help='requestů na scénář')
+    parser.add_argument('--analyze-requests', type=int, default=40, help='requestů na scénáře analýzy')
+    parser.add_argument('--concurrency', type=int, default=8, help='souběžných klientů')
+    parser.add_argument('--stub-latency', type=float, default=0.3, help='latence stubu OpenAI v sekundách')
+    parser.add_argument('--stub-jitter', type=float, default=0.1)
+    parser.add_argument('--stub-error-rate', type=float, default=0.0, help='podíl odpovědí stubu s HTTP 500')
+    parser.add_argument('--stub-malformed-rate', type=float, default=0.0, help='podíl odpovědí s poškozeným JSON')
+    parser.add_argument('--analysis-workers', type=int, default=4)
+    parser.add_argument('--pdf-pages', type=int, default=200)
+    parser.add_argument('--docx-paragraphs', type=int, default=1000)
+    parser.add_argument('--extract-repeat', type=int, default=5)
+    parser.add_argument('--pdf-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--char-budget', type=int, default=100000)
+    parser.add_argument('--only', nargs='+', metavar='SCÉNÁŘ', help='spustit jen vybrané scénáře')
+    parser.add_argument('--output', help='cesta k JSON výsledku (výchozí benchmarks/results/<čas>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.TemporaryDirectory(prefix='studymate-bench-')
+    stub = StubOpenAIServer(
+        latency=args.stub_latency, jitter=args.stub_jitter,
+        error_rate=args.stub_error_rate, malformed_rate=args.stub_malformed_rate
+    ).start()
+
+    # Konfigurace se čte při importu aplikace
+    os.environ.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(workdir.name, 'bench.db'),
+        'OPENAI_BASE_URL': stub.base_url,
+        'OPENAI_API_KEY': 'bench',
+        'ANALYSIS_CACHE_BACKEND': 'memory',
+        'ANALYSIS_CACHE_PATH': os.path.join(workdir.name, 'analysis_cache.sqlite'),
+        'VECTOR_INDEX_PATH': os.path.join(workdir.name, 'note_vectors'),
+        'TEXT_STORE_PATH': os.path.join(workdir.name, 'extracted_texts.sqlite'),
+        'ANALYSIS_WORKERS': str(args.analysis_workers),
+        'OPENAI_RETRY_BACKOFF': '0.05',
+        'ANALYSIS_QUEUE_SIZE': str(max(32, args.analyze_requests)),
+    })
+    from werkzeug.serving import make_server
+    from app import app, analysis_jobs, init_database, instrumentation, text_analyzer
+    from models import db
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    counter = QueryCounter()
+    with app.app_context():
+        init_database()
+        seeded = time.perf_counter()
+        usernames = fixtures.seed_database(args.users, args.sessions, args.notes)
+        seed_seconds = time.perf_counter() - seeded
+        counter.install(app, db.engine)
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-server', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    routes = {}
+    try:
+        for scenario in build_scenarios(args, usernames):
+            if args.only and scenario.name not in args.only:
+                continue
+            print(f'… {scenario.name}', file=sys.stderr)
+            latencies, errors, elapsed = run_scenario(scenario, base_url, usernames, args.concurrency)
+            routes[scenario.name] = summarize(latencies, errors, elapsed, counter.by_scenario.get(scenario.name, []))
+            if scenario.name == 'analyze':
+                with app.app_context():
+                    job_latencies, job_errors = wait_for_jobs(timeout=600)
+                routes['analyze_job'] = summarize(job_latencies, job_errors)
+        extractors = bench_extractors(args) if not args.only or {'extract_pdf', 'extract_docx'} & set(args.only) else {}
+    finally:
+        server.shutdown()
+        analysis_jobs.shutdown()
+        text_analyzer.close()
+        stub.stop()
+        with app.app_context():
+            db.engine.dispose()
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'args': vars(args),
+        },
+        'dataset': {
+            'users': args.users,
+            'sessions': args.users * args.sessions,
+            'notes': args.users * args.notes,
+            'seed_seconds': round(seed_seconds, 2),
+        },
+        'stub': {
+            'requests': stub.requests,
+            'latency_s': args.stub_latency,
+            'jitter_s': args.stub_jitter,
+            'error_rate': args.stub_error_rate,
+            'malformed_rate': args.stub_malformed_rate,
+        },
+        'openai': {
+            'responses': counter_totals(instrumentation.openai_responses, 'outcome'),
+            'retries': counter_totals(instrumentation.openai_retries, 'reason'),
+            'coalesced': sum(value for *_, value in instrumentation.openai_coalesced.samples()),
+        },
+        'background_queries': counter.background,
+        'routes': routes,
+        'extractors': extractors,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, datetime.utcnow().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    workdir.cleanup()
+
+    print_table(results)
+    print(f'Výsledky uloženy do {output}')
+    return results
+
+
+if __name__ == '__main__':
+    main()
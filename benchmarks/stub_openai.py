@@ -0,0 +1,189 @@
+"""Lokální náhrada OpenAI API pro benchmarky.
+
+Odpovídá na ``POST /v1/chat/completions`` (i se ``stream: true``) pevnou
+analýzou ve formátu, který očekává ``TextAnalyzer``, po nastavitelném
+zpoždění. Aplikace se na něj přesměruje proměnnou ``OPENAI_BASE_URL``.
+Stub umí i simulovat chyby (HTTP 500, poškozený JSON, nedostupný model),
+aby šlo ověřit opakování volání a přepnutí na záložní model.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_RESULT = {
+    "summary": [
+        "Buňka je základní stavební a funkční jednotka živých organismů",
+        "Prokaryotní buňky nemají jádro, eukaryotní ano",
+        "Mitochondrie zajišťují buněčné dýchání"
+    ],
+    "questions": [
+        {
+            "question": f"Testová otázka {i}?",
+            "options": ["A) možnost 1", "B) možnost 2", "C) možnost 3", "D) možnost 4"],
+            "correct": "ABCD"[i % 4]
+        }
+        for i in range(1, 6)
+    ],
+    "flashcards": [
+        {"question": f"Kartička {i}", "answer": f"Odpověď {i}"}
+        for i in range(1, 6)
+    ]
+}
+
+
+class StubOpenAIServer:
+    """HTTP server napodobující chat completions OpenAI.
+
+    ``latency`` je doba do první odpovědi v sekundách, ``jitter`` k ní
+    přidá náhodnou odchylku 0 až ``jitter``. Streamovaná odpověď se posílá
+    po ``stream_chunks`` kouscích rozložených do dalšího ``latency``.
+
+    ``error_rate`` je podíl odpovědí s HTTP 500, ``malformed_rate`` podíl
+    odpovědí s téměř platným JSON (blok kódu, čárka navíc, useknutý konec)
+    a modely ve ``failing_models`` odpovídají vždy HTTP 500. Druhy poškození
+    JSON lze omezit parametrem ``malformed_kinds``.
+    """
+
+    MALFORMED_KINDS = ('fence', 'trailing_comma', 'truncated')
+
+    def __init__(self, latency=0.5, jitter=0.0, stream_chunks=20, host='127.0.0.1', port=0,
+                 error_rate=0.0, malformed_rate=0.0, failing_models=(), malformed_kinds=MALFORMED_KINDS):
+        self.latency = latency
+        self.jitter = jitter
+        self.stream_chunks = stream_chunks
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.failing_models = set(failing_models)
+        self.malformed_kinds = tuple(malformed_kinds)
+        self.requests = 0
+        self.requests_by_model = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='stub-openai', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self):
+        return self.latency + random.uniform(0, self.jitter)
+
+    def _count(self, model):
+        with self._lock:
+            self.requests += 1
+            self.requests_by_model[model] = self.requests_by_model.get(model, 0) + 1
+
+    def _content(self):
+        content = json.dumps(STUB_RESULT, ensure_ascii=False)
+        if random.random() >= self.malformed_rate:
+            return content
+        damage = random.choice(self.malformed_kinds)
+        if damage == 'fence':
+            return f'Tady je analýza:\n```json\n{content}\n```'
+        if damage == 'trailing_comma':
+            return content.replace(']', ',]', 1)
+        # Useknutí uprostřed posledních kartiček
+        return content[:int(len(content) * 0.9)]
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.endswith('/chat/completions'):
+                    self.send_error(404)
+                    return
+                model = body.get('model', 'stub')
+                stub._count(model)
+                time.sleep(stub._delay())
+                if model in stub.failing_models or random.random() < stub.error_rate:
+                    self._send_error(500, 'Simulovaná chyba serveru')
+                    return
+                content = stub._content()
+                if body.get('stream'):
+                    self._send_stream(model, content)
+                else:
+                    self._send_completion(model, content)
+
+            def _send_error(self, status, message):
+                payload = json.dumps({
+                    "error": {"message": message, "type": "server_error", "param": None, "code": None}
+                }).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_completion(self, model, content):
+                payload = json.dumps({
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                }).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _send_stream(self, model, content):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                pieces = max(1, stub.stream_chunks)
+                size = len(content) // pieces + 1
+                for start in range(0, len(content), size):
+                    chunk = {
+                        "id": "chatcmpl-stub",
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"content": content[start:start + size]},
+                            "finish_reason": None
+                        }]
+                    }
+                    self.wfile.write(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(stub.latency / pieces)
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.wfile.flush()
+
+        return Handler
@@ -0,0 +1,143 @@
+"""Benchmark sémantického hledání nad velkým počtem poznámek.
+
+Vytvoří syntetické poznámky, spočítá jejich vektory do indexu v dočasném
+adresáři a změří latenci dotazů "související poznámky" (jeden vlastník
+všech poznámek i poznámky rozdělené mezi uživatele), hledání podle
+textu, dávky dotazů a průběžné aktualizace jedné poznámky.
+
+Použití z kořene repozitáře:
+
+    python -m benchmarks.vector_search --notes 100000 --queries 200
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks import fixtures
+from benchmarks.run import RESULTS_DIR, git_commit, summarize
+from semantic import EMBEDDING_DIM, VectorIndex, embed
+
+
+def timed(function, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--notes', type=int, default=100000)
+    parser.add_argument('--users', type=int, default=100, help='vlastníků pro scénář related_multiuser')
+    parser.add_argument('--queries', type=int, default=200, help='dotazů na scénář')
+    parser.add_argument('--batch', type=int, default=32, help='dotazů v jedné dávce')
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM)
+    parser.add_argument('--output', help='cesta k JSON výsledku (výchozí benchmarks/results/vector-<čas>.json)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(1)
+    workdir = tempfile.TemporaryDirectory(prefix='studymate-vectors-')
+    path = os.path.join(workdir.name, 'note_vectors')
+
+    texts = [fixtures.paragraph(rng, sentences=rng.randint(2, 8)) for _ in range(args.notes)]
+    started = time.perf_counter()
+    vectors = np.array([embed(text, args.dim) for text in texts], dtype=np.float32)
+    embed_seconds = time.perf_counter() - started
+
+    single = VectorIndex(path + '-single', dim=args.dim)
+    multi = VectorIndex(path + '-multi', dim=args.dim)
+    started = time.perf_counter()
+    for note_id, vector in enumerate(vectors, start=1):
+        single.upsert(note_id, 1, vector)
+        multi.upsert(note_id, note_id % args.users + 1, vector)
+    single.flush()
+    multi.flush()
+    insert_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    single = VectorIndex(path + '-single', dim=args.dim)
+    open_seconds = time.perf_counter() - started
+
+    def random_note():
+        return rng.randint(1, args.notes)
+
+    def related_single():
+        note_id = random_note()
+        single.search(single.vector(note_id), args.k, owner_id=1, exclude={note_id})
+
+    def related_multi():
+        note_id = random_note()
+        multi.search(multi.vector(note_id), args.k, owner_id=note_id % args.users + 1, exclude={note_id})
+
+    def search_text():
+        single.search(embed(fixtures.sentence(rng), args.dim), args.k, owner_id=1)
+
+    def batch():
+        queries = vectors[[random_note() - 1 for _ in range(args.batch)]]
+        single.search(queries, args.k, owner_id=1)
+
+    def update():
+        note_id = random_note()
+        single.upsert(note_id, 1, embed(fixtures.paragraph(rng), args.dim))
+        single.flush()
+
+    # Zahřátí: první dotaz načte stránky souboru do page cache
+    related_single()
+    queries = {
+        'related_single_owner': summarize(timed(related_single, args.queries)),
+        'related_multiuser': summarize(timed(related_multi, args.queries)),
+        'search_text': summarize(timed(search_text, args.queries)),
+        'update_note': summarize(timed(update, args.queries)),
+    }
+    batch_latencies = timed(batch, max(1, args.queries // args.batch))
+    queries['batch'] = summarize(batch_latencies)
+    queries['batch']['queries_per_second'] = round(args.batch * len(batch_latencies) / sum(batch_latencies), 1)
+
+    results = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'commit': git_commit(),
+            'args': vars(args),
+        },
+        'index': {
+            'notes': args.notes,
+            'dim': args.dim,
+            'embed_notes_per_second': round(args.notes / embed_seconds, 1),
+            'insert_seconds': round(insert_seconds, 3),
+            'open_seconds': round(open_seconds, 3),
+            'file_mb': round(sum(os.path.getsize(path + '-single' + suffix) for suffix in ('.vec', '.meta')) / 2 ** 20, 1),
+        },
+        'queries': queries,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, 'vector-' + datetime.utcnow().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    workdir.cleanup()
+
+    index = results['index']
+    print(f"{index['notes']} poznámek, {index['dim']} dimenzí, {index['file_mb']} MB; "
+          f"vektory {index['embed_notes_per_second']} poznámek/s, otevření indexu {index['open_seconds']} s")
+    print(f"{'scénář':<22} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, summary in queries.items():
+        print(f"{name:<22} {summary['p50_ms']:>9} {summary['p95_ms']:>9} {summary['p99_ms']:>9}")
+    print(f"dávka {args.batch} dotazů: {queries['batch']['queries_per_second']} dotazů/s")
+    print(f'Výsledky uloženy do {output}')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Předpočítání analýz témat ze study_materials.json.
+
+Výsledky se ukládají do tabulky CatalogueAnalysis spolu s hashem textu,
+modelu a verze promptu, takže /analyze vrací témata z katalogu hned a bez
+volání OpenAI. Každé téma se commituje samostatně a témata se stejným
+hashem se přeskakují: přerušený běh stačí spustit znovu a po úpravě
+katalogu se analyzují jen změněná témata. Opakování volání a záložní
+modely řeší ``analyze`` (TextAnalyzer), tady se nic neopakuje.
+
+Spuštění: ``flask --app app precompute-catalogue``.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from analysis import PROMPT_VERSION
+from analysis_cache import make_cache_key
+from models import db, CatalogueAnalysis
+
+
+def content_hash(text, model):
+    """Hash textu tématu spolu s modelem a verzí promptu"""
+    return make_cache_key(text, model, PROMPT_VERSION)
+
+
+def precomputed_result(subject, topic, text, model):
+    """Uložená analýza tématu, pokud odpovídá aktuálnímu textu, jinak None"""
+    row = CatalogueAnalysis.query.filter_by(subject=subject, topic=topic).first()
+    if row is None or row.content_hash != content_hash(text, model):
+        return None
+    return row.payload.result
+
+
+def catalogue_topics(materials, model, subjects=None, force=False):
+    """Rozdělí témata katalogu na (k analýze, počet přeskočených)"""
+    stored = {(row.subject, row.topic): row.content_hash
+              for row in db.session.query(CatalogueAnalysis.subject, CatalogueAnalysis.topic,
+                                          CatalogueAnalysis.content_hash)}
+    pending = []
+    skipped = 0
+    for subject, topics in materials.topic_index().items():
+        if subjects and subject not in subjects:
+            continue
+        for topic in topics:
+            text = materials.get(subject, topic)
+            if not text:
+                continue
+            digest = content_hash(text, model)
+            if not force and stored.get((subject, topic)) == digest:
+                skipped += 1
+                continue
+            pending.append((subject, topic, text, digest))
+    return pending, skipped
+
+
+def prune_removed(materials):
+    """Smaže uložené analýzy témat, která už v katalogu nejsou"""
+    index = materials.topic_index()
+    removed = 0
+    for row in CatalogueAnalysis.query.all():
+        if row.topic not in index.get(row.subject, ()):
+            db.session.delete(row)
+            removed += 1
+    db.session.commit()
+    return removed
+
+
+def precompute_catalogue(materials, analyze, model, concurrency=4, subjects=None, force=False, progress=None):
+    """Analyzuje změněná témata katalogu a uloží výsledky.
+
+    ``analyze`` běží nejvýše v ``concurrency`` vláknech; ukládání do
+    databáze probíhá ve volajícím vlákně (potřebuje app context).
+    ``progress(done, total, subject, topic, result, seconds)``
+    se volá po každém tématu. Vrací souhrn běhu jako slovník.
+    """
+    started = time.perf_counter()
+    pending, skipped = catalogue_topics(materials, model, subjects, force)
+    summary = {'total': len(pending) + skipped, 'analyzed': 0, 'skipped': skipped, 'failed': 0}
+
+    def run(text):
+        topic_started = time.perf_counter()
+        result = analyze(text)
+        return result, time.perf_counter() - topic_started
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(run, text): (subject, topic, digest)
+            for subject, topic, text, digest in pending
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            subject, topic, digest = futures[future]
+            result, seconds = future.result()
+            if result.get('error'):
+                summary['failed'] += 1
+            else:
+                CatalogueAnalysis.store(subject, topic, digest, model, result)
+                db.session.commit()
+                summary['analyzed'] += 1
+            if progress is not None:
+                progress(done, len(pending), subject, topic, result, seconds)
+
+    summary['seconds'] = time.perf_counter() - started
+    return summary
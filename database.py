@@ -0,0 +1,65 @@
+"""Nastavení připojení k databázi podle DATABASE_URL.
+
+SQLite běží ve WAL režimu: čtenáři neblokují zapisovatele a souběžní
+zapisovatelé na sebe čekají až ``SQLITE_BUSY_TIMEOUT_MS`` místo okamžité
+chyby "database is locked". Pro PostgreSQL a další databázové servery se
+nastaví velikost poolu spojení a jejich ověření před použitím.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def normalize_database_url(url):
+    """Převede zastaralé schéma postgres:// (Heroku apod.) na postgresql://"""
+    if url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS pro danou databázi"""
+    if is_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        # Čekání na zámek řeší PRAGMA busy_timeout, viz install_sqlite_pragmas
+        return {}
+    return {
+        'pool_size': config.get('DB_POOL_SIZE', 10),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800),  # server může nečinná spojení zavřít
+        'pool_pre_ping': True,
+    }
+
+
+def install_sqlite_pragmas(app, db):
+    """Nastaví PRAGMA na každém novém SQLite spojení (volá se po db.init_app)"""
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite':
+        return False
+    synchronous = app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'SQLITE_SYNCHRONOUS musí být jedno z {", ".join(SYNCHRONOUS_MODES)}')
+    busy_timeout = int(app.config.get('SQLITE_BUSY_TIMEOUT_MS', 15000))
+    cache_size_kb = int(app.config.get('SQLITE_CACHE_SIZE_KB', 20000))
+    in_memory = url.database in (None, '', ':memory:')
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+        if not in_memory:
+            cursor.execute('PRAGMA journal_mode = WAL')
+        # NORMAL je ve WAL režimu bezpečné proti poškození, při výpadku napájení
+        # se může ztratit jen poslední transakce
+        cursor.execute(f'PRAGMA synchronous = {synchronous}')
+        cursor.execute(f'PRAGMA cache_size = -{cache_size_kb}')
+        cursor.execute('PRAGMA temp_store = MEMORY')
+        cursor.close()
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', set_pragmas)
+    return True
@@ -0,0 +1,145 @@
+"""Postupná extrakce textu z nahraných dokumentů (PDF, DOCX, TXT).
+
+Všechny extraktory jsou generátory, které vrací text po stránkách nebo
+odstavcích, takže volající může skončit, jakmile má dost textu pro AI.
+Velká PDF se rozdělí na souvislé úseky stránek, jeden na proces z poolu;
+každý proces si PDF načte jednou z dočasného souboru a extrahuje svůj úsek.
+"""
+import io
+import math
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+from docx import Document
+
+ALLOWED_EXTENSIONS = {'txt', 'pdf', 'docx'}
+
+# Nejmenší úsek stránek pro jeden proces; menší PDF se extrahují bez poolu
+PDF_MIN_PAGES_PER_WORKER = 32
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def file_extension(filename):
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def allowed_file(filename):
+    return file_extension(filename) in ALLOWED_EXTENSIONS
+
+
+def get_process_pool(max_workers=None):
+    """Sdílený pool procesů pro extrakci PDF (vytvoří se při prvním použití)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+        return _pool
+
+
+def _iter_pdf_pages(reader, start, stop):
+    for i in range(start, stop):
+        yield (reader.pages[i].extract_text() or '') + '\n'
+
+
+def _extract_pdf_range(path, start, stop):
+    """Extrahuje stránky start..stop-1 ze souboru (běží v podřízeném procesu)"""
+    return list(_iter_pdf_pages(PyPDF2.PdfReader(path), start, stop))
+
+
+def iter_txt_chunks(data):
+    """Čte obsah TXT souboru po řádcích"""
+    try:
+        text = data.decode('utf-8')
+    except UnicodeDecodeError:
+        text = data.decode('cp1250')
+    yield from io.StringIO(text)
+
+
+def iter_docx_chunks(data):
+    """Čte obsah DOCX souboru po odstavcích"""
+    doc = Document(io.BytesIO(data))
+    for paragraph in doc.paragraphs:
+        yield paragraph.text + '\n'
+
+
+def iter_pdf_chunks(data, max_workers=None, char_budget=None):
+    """Čte obsah PDF souboru po stránkách.
+
+    Prvních ``PDF_MIN_PAGES_PER_WORKER`` stránek se extrahuje v tomto
+    procesu a podle nich se odhadne, kolik dalších stránek se do
+    ``char_budget`` ještě vejde. Když je to aspoň dva úseky po
+    ``PDF_MIN_PAGES_PER_WORKER`` stránkách a ``max_workers`` i počet jader
+    jsou > 1, rozdělí se na souvislé úseky, jeden na proces; obsah se procesům předává
+    dočasným souborem, ne kopií v každé úloze. Zbytek dokumentu se čte
+    opět postupně, takže volající může kdykoli skončit.
+    """
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    page_count = len(reader.pages)
+    start = min(page_count, PDF_MIN_PAGES_PER_WORKER)
+    chars = 0
+    for page in _iter_pdf_pages(reader, 0, start):
+        chars += len(page)
+        yield page
+
+    stop = page_count
+    if char_budget is not None and chars:
+        if chars >= char_budget:
+            return
+        # Odhad podle průměrné délky stránky s rezervou 25 %
+        stop = min(page_count, start + math.ceil((char_budget - chars) * start / chars * 1.25))
+    # Víc procesů než jader extrakci nezrychlí
+    cpus = os.cpu_count() or 1
+    workers = min(max_workers or cpus, cpus, (stop - start) // PDF_MIN_PAGES_PER_WORKER)
+    if workers > 1:
+        yield from _iter_pdf_pages_parallel(data, start, stop, workers, max_workers)
+        start = stop
+    yield from _iter_pdf_pages(reader, start, page_count)
+
+
+def _iter_pdf_pages_parallel(data, start, stop, workers, max_workers):
+    """Stránky start..stop-1 po souvislých úsecích v poolu procesů, v pořadí stránek"""
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(data)
+    pool = get_process_pool(max_workers)
+    bounds = [start + (stop - start) * i // workers for i in range(workers + 1)]
+    futures = [pool.submit(_extract_pdf_range, f.name, a, b) for a, b in zip(bounds, bounds[1:])]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        for future in futures:
+            future.cancel()
+        os.unlink(f.name)
+
+
+def iter_document_chunks(data, filename, max_workers=None, char_budget=None):
+    """Vybere extraktor podle přípony souboru"""
+    extension = file_extension(filename)
+    if extension == 'pdf':
+        return iter_pdf_chunks(data, max_workers, char_budget)
+    elif extension == 'docx':
+        return iter_docx_chunks(data)
+    return iter_txt_chunks(data)
+
+
+def extract_text(data, filename, char_budget=None, max_workers=None):
+    """Vrátí text dokumentu, nejvýše ``char_budget`` znaků"""
+    parts = []
+    remaining = char_budget
+    chunks = iter_document_chunks(data, filename, max_workers, char_budget)
+    try:
+        for chunk in chunks:
+            if remaining is not None:
+                if len(chunk) >= remaining:
+                    parts.append(chunk[:remaining])
+                    break
+                remaining -= len(chunk)
+            parts.append(chunk)
+    finally:
+        chunks.close()
+    return ''.join(parts)
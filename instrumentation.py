@@ -0,0 +1,311 @@
+"""Měření výkonu aplikace a endpoint /metrics ve formátu Prometheus.
+
+Pro každý request se měří celkový čas a počet a čas SQL dotazů (přes
+události enginu SQLAlchemy), dále latence a spotřeba tokenů volání OpenAI
+a doba extrakce textu z dokumentů. Requesty pomalejší než SLOW_REQUEST_MS
+se zalogují i s nejpomalejšími dotazy. Při METRICS_ENABLED=0 se žádné
+háčky neregistrují a záznamové metody hned skončí.
+
+/metrics vyžaduje "Authorization: Bearer <METRICS_TOKEN>". Bez nastaveného
+tokenu odpovídá jen přímým requestům z localhostu. Requesty přes reverzní
+proxy (s hlavičkou X-Forwarded-For) se odmítnou, i když přichází z 127.0.0.1.
+"""
+import heapq
+import hmac
+import threading
+import time
+
+from flask import Response, abort, g, has_request_context, request
+from sqlalchemy import event
+
+LOOPBACK_ADDRESSES = frozenset({'127.0.0.1', '::1'})
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, lock):
+        self.name = name
+        self.help = help
+        self.type = 'counter'
+        self._lock = lock
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, key, None, value
+
+
+class Histogram:
+    def __init__(self, name, help, lock, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.type = 'histogram'
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._lock = lock
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', key, ('le', _format_value(bound)), cumulative
+            yield f'{self.name}_sum', key, None, total
+            yield f'{self.name}_count', key, None, count
+
+
+class Gauge:
+    """Hodnota čtená až při exportu: ``collect()`` vrací {popisky: hodnota}"""
+
+    def __init__(self, name, help, collect):
+        self.name = name
+        self.help = help
+        self.type = 'gauge'
+        self._collect = collect
+
+    def samples(self):
+        for labels, value in self._collect().items():
+            yield self.name, tuple(sorted(labels)), None, value
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help, self._lock))
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS):
+        return self._add(Histogram(name, help, self._lock, buckets))
+
+    def gauge(self, name, help, collect):
+        return self._add(Gauge(name, help, collect))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Text ve formátu Prometheus exposition 0.0.4"""
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                if metric.type == 'gauge':
+                    continue
+                self._render_metric(metric, lines)
+        # Gauge se čtou mimo zámek, jejich zdroje mají vlastní
+        for metric in self._metrics:
+            if metric.type == 'gauge':
+                self._render_metric(metric, lines)
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_metric(metric, lines):
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        for name, labels, extra, value in metric.samples():
+            lines.append(f'{name}{_format_labels(labels, extra)} {_format_value(value)}')
+
+
+class _RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'slowest', 'status')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest = []  # halda (doba, SQL) nejpomalejších dotazů
+        self.status = None
+
+
+class Instrumentation:
+    """Sběr metrik pro Flask aplikaci a její SQLAlchemy engine"""
+
+    def __init__(self, app=None, db=None):
+        self.enabled = False
+        self.registry = MetricsRegistry()
+        self.slow_request_seconds = 1.0
+        self.slow_query_count = 3
+        self.token = None
+        self.logger = None
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.slow_request_seconds = app.config.get('SLOW_REQUEST_MS', 1000) / 1000
+        self.slow_query_count = app.config.get('SLOW_REQUEST_QUERIES', 3)
+        self.token = app.config.get('METRICS_TOKEN') or None
+        self.logger = app.logger
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        if not self.enabled:
+            return
+
+        registry = self.registry
+        self.request_duration = registry.histogram(
+            'studymate_http_request_duration_seconds', 'Doba zpracování requestu včetně streamované odpovědi')
+        self.request_queries = registry.histogram(
+            'studymate_http_request_db_queries', 'Počet SQL dotazů na request', QUERY_COUNT_BUCKETS)
+        self.request_db_time = registry.histogram(
+            'studymate_http_request_db_seconds', 'Čas strávený SQL dotazy během requestu')
+        self.db_queries = registry.counter(
+            'studymate_db_queries_total', 'Počet SQL dotazů (context=request nebo background)')
+        self.db_time = registry.counter(
+            'studymate_db_query_seconds_total', 'Celkový čas SQL dotazů')
+        self.openai_duration = registry.histogram(
+            'studymate_openai_request_duration_seconds', 'Latence volání OpenAI')
+        self.openai_tokens = registry.counter(
+            'studymate_openai_tokens_total', 'Spotřebované tokeny OpenAI (kind=prompt nebo completion)')
+        self.openai_responses = registry.counter(
+            'studymate_openai_responses_total', 'Odpovědi OpenAI podle výsledku parsování (valid, repaired, invalid)')
+        self.openai_retries = registry.counter(
+            'studymate_openai_retries_total', 'Opakovaná volání OpenAI podle důvodu')
+        self.openai_fallbacks = registry.counter(
+            'studymate_openai_fallbacks_total', 'Přepnutí na záložní model')
+        self.openai_coalesced = registry.counter(
+            'studymate_openai_coalesced_total', 'Analýzy, které počkaly na stejné rozpracované volání OpenAI')
+        self.extraction_duration = registry.histogram(
+            'studymate_extraction_duration_seconds', 'Doba extrakce textu z dokumentu')
+        self.extracted_chars = registry.counter(
+            'studymate_extracted_chars_total', 'Počet extrahovaných znaků')
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, 'before_cursor_execute', self._before_query)
+        event.listen(engine, 'after_cursor_execute', self._after_query)
+        app.before_request(self._start_request)
+        app.after_request(self._capture_status)
+        app.teardown_request(self._finish_request)
+
+    def add_gauge(self, name, help, collect):
+        """Zaregistruje gauge čtenou při exportu (``collect`` vrací {((popisek, hodnota), ...): číslo})"""
+        if self.enabled:
+            self.registry.gauge(name, help, collect)
+
+    def observe_openai(self, model, mode, seconds, usage=None, error=False):
+        """Zaznamená jedno volání OpenAI (mode: sync, async nebo stream)"""
+        if not self.enabled:
+            return
+        self.openai_duration.observe(seconds, model=model, mode=mode, outcome='error' if error else 'ok')
+        if usage is not None:
+            self.openai_tokens.inc(usage.prompt_tokens or 0, model=model, kind='prompt')
+            self.openai_tokens.inc(usage.completion_tokens or 0, model=model, kind='completion')
+
+    def observe_openai_response(self, model, outcome):
+        if self.enabled:
+            self.openai_responses.inc(model=model, outcome=outcome)
+
+    def observe_openai_retry(self, model, reason):
+        if self.enabled:
+            self.openai_retries.inc(model=model, reason=reason)
+
+    def observe_openai_fallback(self, model):
+        if self.enabled:
+            self.openai_fallbacks.inc(model=model)
+
+    def observe_openai_coalesced(self, model):
+        if self.enabled:
+            self.openai_coalesced.inc(model=model)
+
+    def observe_extraction(self, file_format, seconds, chars):
+        if not self.enabled:
+            return
+        self.extraction_duration.observe(seconds, format=file_format)
+        self.extracted_chars.inc(chars, format=file_format)
+
+    def metrics_view(self):
+        if not self.enabled:
+            abort(404)
+        if self.token:
+            expected = f'Bearer {self.token}'
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+                abort(401)
+        elif request.remote_addr not in LOOPBACK_ADDRESSES or request.headers.get('X-Forwarded-For'):
+            abort(403)
+        return Response(self.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    def _before_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+
+    def _after_query(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info.pop('query_started')
+        stats = g.get('_instrumentation') if has_request_context() else None
+        if stats is None:
+            self.db_queries.inc(context='background')
+            self.db_time.inc(duration, context='background')
+            return
+        stats.queries += 1
+        stats.db_time += duration
+        if len(stats.slowest) < self.slow_query_count:
+            heapq.heappush(stats.slowest, (duration, statement))
+        elif duration > stats.slowest[0][0]:
+            heapq.heapreplace(stats.slowest, (duration, statement))
+
+    def _start_request(self):
+        g._instrumentation = _RequestStats()
+
+    def _capture_status(self, response):
+        stats = g.get('_instrumentation')
+        if stats is not None:
+            stats.status = response.status_code
+        return response
+
+    def _finish_request(self, exc):
+        stats = g.pop('_instrumentation', None)
+        if stats is None:
+            return
+        duration = time.perf_counter() - stats.started
+        endpoint = request.endpoint or '<unmatched>'
+        status = stats.status if exc is None else 500
+        self.request_duration.observe(duration, method=request.method, endpoint=endpoint, status=status)
+        self.request_queries.observe(stats.queries, endpoint=endpoint)
+        self.request_db_time.observe(stats.db_time, endpoint=endpoint)
+        self.db_queries.inc(stats.queries, context='request')
+        self.db_time.inc(stats.db_time, context='request')
+        if duration >= self.slow_request_seconds:
+            slowest = '\n'.join(
+                f'  {seconds * 1000:.1f} ms  {" ".join(statement.split())[:300]}'
+                for seconds, statement in sorted(stats.slowest, reverse=True)
+            )
+            self.logger.warning(
+                'Pomalý request %s %s (%s): %.0f ms, %d SQL dotazů za %.0f ms%s',
+                request.method, request.full_path.rstrip('?'), endpoint, duration * 1000,
+                stats.queries, stats.db_time * 1000, '\n' + slowest if slowest else ''
+            )
@@ -0,0 +1,181 @@
+"""Fronta úloh pro asynchronní AI analýzu mimo HTTP request."""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from models import db, AnalysisJob, AnalysisPayload
+
+
+class QueueFullError(Exception):
+    """Fronta je plná, klient to má zkusit později"""
+
+
+def new_job_id():
+    return uuid.uuid4().hex
+
+
+class JobQueue:
+    """Fronta analýz uložená v tabulce AnalysisJob a zpracovávaná poolem vláken.
+
+    Počet současně běžících úloh je omezen ``max_workers`` a počet úloh
+    čekajících ve frontě ``max_pending``; při překročení ``submit`` vyhodí
+    ``QueueFullError``. Úlohy nedokončené před restartem se znovu zařadí
+    při prvním requestu procesu, dokončené úlohy starší než
+    ``ANALYSIS_JOB_RETENTION_DAYS`` se zároveň smažou.
+    """
+
+    def __init__(self, app=None, handler=None):
+        self.app = None
+        self.handler = handler
+        self._executor = None
+        self._slots = None
+        self._started = False
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, handler)
+
+    def init_app(self, app, handler=None):
+        self.app = app
+        if handler is not None:
+            self.handler = handler
+        max_workers = app.config.get('ANALYSIS_WORKERS', 4)
+        max_pending = app.config.get('ANALYSIS_QUEUE_SIZE', 32)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        app.before_request(self._start_once)
+
+    def _start_once(self):
+        if self._started:
+            return
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            try:
+                self.purge_finished()
+                self.resume_pending()
+            except Exception as e:
+                # Např. neprovedené migrace; request kvůli tomu selhat nemá
+                db.session.rollback()
+                self.app.logger.warning('Obnovení fronty analýz selhalo: %s', e)
+
+    def submit(self, user_id, subject=None, topic=None, source_name=None, source_data=None, job_id=None,
+               source_hash=None, source_text=None):
+        """Uloží úlohu do fronty a vrátí ji; zpracování proběhne na pozadí
+
+        Obsah nahraného souboru se ukládá přímo do řádku úlohy, aby úloha
+        přežila restart a nebylo nutné zapisovat dočasné soubory; handler ho
+        po extrakci nahradí textem. Když je text souboru už extrahovaný,
+        ukládá se rovnou ``source_text``.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError('Fronta analýz je plná')
+        try:
+            job = AnalysisJob(
+                id=job_id or new_job_id(),
+                user_id=user_id,
+                subject=subject,
+                topic=topic,
+                source_name=source_name,
+                source_data=source_data,
+                source_hash=source_hash,
+                source_text=source_text,
+                status='queued'
+            )
+            db.session.add(job)
+            db.session.commit()
+        except Exception:
+            self._slots.release()
+            raise
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def record_finished(self, user_id, subject, topic, result):
+        """Uloží rovnou dokončenou úlohu (výsledek je už známý, fronta se přeskočí)"""
+        now = datetime.utcnow()
+        job = AnalysisJob(
+            id=new_job_id(),
+            user_id=user_id,
+            subject=subject,
+            topic=topic,
+            payload=AnalysisPayload.store(result),
+            status='done',
+            started_at=now,
+            finished_at=now
+        )
+        db.session.add(job)
+        return job
+
+    @contextmanager
+    def slot(self):
+        """Zabere místo ve frontě pro analýzu běžící mimo pool (např. streamovanou)"""
+        if not self._slots.acquire(blocking=False):
+            raise QueueFullError('Fronta analýz je plná')
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def resume_pending(self):
+        """Po restartu znovu zařadí úlohy, které nebyly dokončeny"""
+        self._started = True
+        pending = AnalysisJob.query.filter(AnalysisJob.status.in_(['queued', 'running'])).all()
+        for job in pending:
+            job.status = 'queued'
+        db.session.commit()
+        for job in pending:
+            # Úlohy z minulého běhu obcházejí limit fronty, aby se neztratily
+            self._executor.submit(self._run, job.id, False)
+        return len(pending)
+
+    def purge_finished(self, max_age=None):
+        """Smaže dokončené úlohy starší než ``max_age`` a vrátí jejich počet
+
+        Výsledky zůstávají ve sdílených AnalysisPayload u study sessions.
+        """
+        if max_age is None:
+            max_age = timedelta(days=self.app.config.get('ANALYSIS_JOB_RETENTION_DAYS', 30))
+        deleted = AnalysisJob.query.filter(
+            AnalysisJob.status.in_(['done', 'failed']),
+            AnalysisJob.finished_at < datetime.utcnow() - max_age
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job_id, holds_slot=True):
+        try:
+            with self.app.app_context():
+                job = db.session.get(AnalysisJob, job_id)
+                if job is None:
+                    return
+                job.status = 'running'
+                job.started_at = datetime.utcnow()
+                db.session.commit()
+                try:
+                    result = self.handler(job)
+                    job.source_data = None
+                    job.source_text = None
+                    if result.get('error'):
+                        job.status = 'failed'
+                        job.error = result['error']
+                    else:
+                        # Stejný výsledek sdílí úlohy i study sessions
+                        job.payload = AnalysisPayload.store(result)
+                        job.status = 'done'
+                except Exception as e:
+                    db.session.rollback()
+                    job = db.session.get(AnalysisJob, job_id)
+                    job.status = 'failed'
+                    job.error = f'Chyba serveru: {str(e)}'
+                    job.source_data = None
+                    job.source_text = None
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+        finally:
+            if holds_slot:
+                self._slots.release()
@@ -0,0 +1,107 @@
+"""Katalog studijních materiálů načítaný ze study_materials.json."""
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class MaterialsRepository:
+    """Materiály v paměti, znovu načtené jen při změně souboru.
+
+    Změna se zjišťuje podle mtime a velikosti souboru (nejvýše jednou za
+    ``check_interval`` sekund); pokud se obsah nezměnil (stejný hash),
+    JSON se znovu neparsuje. Texty témat se vrací jen přes ``get``,
+    stránky tak nemusí posílat celý katalog.
+    """
+
+    def __init__(self, path, check_interval=2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._digest = None
+        self._checked_at = 0.0
+        self._texts = {}
+        self._topic_index = {}
+        self._subject_choices = []
+
+    def get(self, subject, topic):
+        """Text tématu nebo None, pokud neexistuje"""
+        self._ensure_fresh()
+        return self._texts.get((subject, topic))
+
+    def __contains__(self, key):
+        self._ensure_fresh()
+        return key in self._texts
+
+    def subjects(self):
+        self._ensure_fresh()
+        return list(self._topic_index)
+
+    def topic_index(self):
+        """Předměty a jejich témata bez textů: {předmět: [téma, ...]}"""
+        self._ensure_fresh()
+        return self._topic_index
+
+    def subject_choices(self):
+        """Volby pro pole předmětu v NoteForm"""
+        self._ensure_fresh()
+        return self._subject_choices
+
+    def digest(self):
+        """Hash obsahu souboru; mění se jen při změně katalogu"""
+        self._ensure_fresh()
+        return self._digest
+
+    def items(self):
+        """Všechna témata jako [((předmět, téma), text)]"""
+        self._ensure_fresh()
+        return list(self._texts.items())
+
+    def invalidate(self):
+        """Vynutí kontrolu souboru při příštím přístupu"""
+        self._checked_at = 0.0
+
+    def reload(self):
+        """Načte soubor znovu (pokud se jeho obsah změnil)"""
+        with self._lock:
+            self._load()
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if self._signature is not None and now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self._stat_signature() != self._signature:
+                self._load()
+
+    def _stat_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return (None, None)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _load(self):
+        signature = self._stat_signature()
+        try:
+            with open(self.path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            raw = b'{}'
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest != self._digest:
+            materials = json.loads(raw.decode('utf-8'))
+            self._texts = {
+                (subject, topic): text
+                for subject, topics in materials.items()
+                for topic, text in topics.items()
+            }
+            self._topic_index = {subject: list(topics) for subject, topics in materials.items()}
+            self._subject_choices = [('', 'Bez předmětu')] + [(subject, subject) for subject in materials]
+            self._digest = digest
+        self._signature = signature
@@ -0,0 +1,112 @@
+"""Verzované migrace schématu databáze.
+
+Každá migrace se provede právě jednou a zapíše se do tabulky
+``schema_migrations``. Migrace počítají i s databázemi vytvořenými dřív
+přes ``db.create_all()``: nejdřív se dotvoří chybějící tabulky a pak se
+doplní sloupce, indexy a data. Nové migrace se přidávají na konec
+seznamu MIGRATIONS s dalším číslem verze, existující se už nemění.
+
+Spuštění: ``flask --app app db-upgrade`` (nebo automaticky v ``python app.py``).
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select
+
+from models import (
+    db, CatalogueAnalysis, Flashcard, Note, StudySession, add_flashcard_columns, add_job_source_hash,
+    add_job_source_text, backfill_daily_rollups, backfill_flashcards, backfill_note_tags, create_missing_indexes, migrate_analysis_payloads,
+    migrate_job_payloads
+)
+from search import install_note_search
+
+schema_migrations = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+
+
+def create_tables():
+    """Tabulky, které v databázi ještě nejsou (existující se nemění)"""
+    db.create_all()
+
+
+def create_note_search():
+    install_note_search(db)
+
+
+def replace_index(old_name, model, new_name):
+    """Nahradí starý index indexem z definice modelu"""
+    with db.engine.begin() as conn:
+        conn.execute(db.text(f'DROP INDEX IF EXISTS {old_name}'))
+    index = next(index for index in model.__table__.indexes if index.name == new_name)
+    index.create(db.engine, checkfirst=True)
+
+
+def keyset_indexes():
+    # Indexy pro stránkování podle (čas, id) včetně id
+    replace_index('ix_note_user_updated', Note, 'ix_note_user_updated_id')
+    replace_index('ix_study_session_user_created', StudySession, 'ix_study_session_user_created_id')
+
+
+def catalogue_analyses():
+    CatalogueAnalysis.__table__.create(db.engine, checkfirst=True)
+
+
+def flashcards():
+    # Kartičky k opakování vytažené i z dřívějších výsledků analýz
+    Flashcard.__table__.create(db.engine, checkfirst=True)
+    add_flashcard_columns()
+    backfill_flashcards()
+
+
+def job_payloads():
+    # Výsledky úloh odkazují na sdílené AnalysisPayload místo vlastní kopie JSON
+    migrate_job_payloads()
+    create_missing_indexes()  # index pro mazání starých úloh podle finished_at
+
+
+# (verze, název, funkce); funkce běží v app contextu a smí commitovat
+MIGRATIONS = [
+    (1, 'create_tables', create_tables),
+    (2, 'analysis_payloads', migrate_analysis_payloads),
+    (3, 'indexes', create_missing_indexes),
+    (4, 'note_search', create_note_search),
+    (5, 'note_tags', backfill_note_tags),
+    (6, 'daily_rollups', backfill_daily_rollups),
+    (7, 'keyset_indexes', keyset_indexes),
+    (8, 'catalogue_analyses', catalogue_analyses),
+    (9, 'flashcards', flashcards),
+    (10, 'upload_hashes', add_job_source_hash),
+    (11, 'upload_texts', add_job_source_text),
+    (12, 'job_payloads', job_payloads),
+]
+
+
+def applied_versions():
+    with db.engine.begin() as conn:
+        schema_migrations.create(conn, checkfirst=True)
+        return {version for (version,) in conn.execute(select(schema_migrations.c.version))}
+
+
+def pending_migrations():
+    applied = applied_versions()
+    return [(version, name) for version, name, _ in MIGRATIONS if version not in applied]
+
+
+def upgrade():
+    """Provede čekající migrace v pořadí verzí a vrátí jejich názvy"""
+    applied = applied_versions()
+    done = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate()
+        db.session.commit()
+        with db.engine.begin() as conn:
+            conn.execute(schema_migrations.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        done.append(name)
+    return done
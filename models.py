@@ -1,10 +1,32 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_login import UserMixin
-from datetime import datetime
-import bcrypt
+from datetime import datetime, timedelta
+import hashlib
+import json
+import zlib
+from passwords import password_hasher
+import srs
 
 db = SQLAlchemy()
 
+def get_or_create(model, create, **keys):
+    """Return (row, created) for the unique keys, inserting create() if no row exists.
+    
+    The insert runs in a savepoint, so when a concurrent request inserts the
+    same row first, the existing row is read back instead of failing.
+    """
+    instance = model.query.filter_by(**keys).first()
+    if instance is not None:
+        return instance, False
+    try:
+        with db.session.begin_nested():
+            instance = create()
+            db.session.add(instance)
+        return instance, True
+    except IntegrityError:
+        return model.query.filter_by(**keys).one(), False
+
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -14,20 +36,57 @@ class User(UserMixin, db.Model):
     
     # Relationships
     study_sessions = db.relationship('StudySession', backref='user', lazy=True, cascade='all, delete-orphan')
+    flashcards = db.relationship('Flashcard', backref='user', lazy=True, cascade='all, delete-orphan')
     notes = db.relationship('Note', backref='user', lazy=True, cascade='all, delete-orphan')
     progress = db.relationship('UserProgress', backref='user', lazy=True, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hash and set password"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash and set password (bcrypt runs in the password hashing pool)"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.check(password, self.password_hash)
+    
+    @property
+    def password_needs_rehash(self):
+        """True when the stored hash uses a different bcrypt cost than configured"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def __repr__(self):
         return f'<User {self.username}>'
 
+class AnalysisPayload(db.Model):
+    """Analysis result stored once per distinct content, zlib-compressed"""
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # SHA-256 of canonical JSON
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer, nullable=False)  # Uncompressed size in bytes
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @staticmethod
+    def _serialize(result):
+        return json.dumps(result, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    
+    @classmethod
+    def store(cls, result):
+        """Return the payload row for the result, creating it only if the content is new"""
+        raw = cls._serialize(result)
+        content_hash = hashlib.sha256(raw).hexdigest()
+        payload, _ = get_or_create(
+            cls,
+            lambda: cls(content_hash=content_hash, data=zlib.compress(raw, 6), size=len(raw)),
+            content_hash=content_hash
+        )
+        return payload
+    
+    @property
+    def result(self):
+        return json.loads(zlib.decompress(self.data).decode('utf-8'))
+    
+    def __repr__(self):
+        return f'<AnalysisPayload {self.content_hash[:12]}>'
+
 class StudySession(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -36,9 +95,25 @@ class StudySession(db.Model):
     duration_minutes = db.Column(db.Integer, default=0)
     questions_answered = db.Column(db.Integer, default=0)
     correct_answers = db.Column(db.Integer, default=0)
-    materials_analyzed = db.Column(db.Text, nullable=True)  # JSON string of analyzed content
+    # Legacy inline JSON, moved to AnalysisPayload by migrate_analysis_payloads; deferred so lists never load it
+    materials_analyzed = db.deferred(db.Column(db.Text, nullable=True))
+    payload_id = db.Column(db.Integer, db.ForeignKey('analysis_payload.id'), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    payload = db.relationship('AnalysisPayload', lazy='select')
+    
+    # Recent sessions of a user (keyset pages on created_at, id) are a range scan on this index
+    __table_args__ = (db.Index('ix_study_session_user_created_id', 'user_id', 'created_at', 'id'),)
+    
+    @property
+    def analysis_result(self):
+        """Analyzed content as a dict (loaded on first access), or None"""
+        if self.payload_id is not None:
+            return self.payload.result
+        if self.materials_analyzed:
+            return json.loads(self.materials_analyzed)
+        return None
+    
     @property
     def accuracy_percentage(self):
         if self.questions_answered == 0:
@@ -48,6 +123,33 @@ class StudySession(db.Model):
     def __repr__(self):
         return f'<StudySession {self.topic}>'
 
+note_tags = db.Table(
+    'note_tags',
+    db.Column('note_id', db.Integer, db.ForeignKey('note.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tag.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_note_tags_tag_id', 'tag_id')
+)
+
+class Tag(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+    note_count = db.Column(db.Integer, nullable=False, default=0)  # Maintained by Note.set_tags
+    
+    # Also serves as the (user_id, name) index for the tag filter sidebar
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='user_tag_unique'),)
+    
+    @classmethod
+    def counts_for_user(cls, user_id):
+        """Return [(name, note_count)] of the user's tags that are in use"""
+        return db.session.query(cls.name, cls.note_count).filter(
+            cls.user_id == user_id,
+            cls.note_count > 0
+        ).order_by(cls.name).all()
+    
+    def __repr__(self):
+        return f'<Tag {self.name}>'
+
 class Note(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -58,6 +160,12 @@ class Note(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Keyset pages of the notes list (updated_at, id) are a range scan on this index
+    __table_args__ = (db.Index('ix_note_user_updated_id', 'user_id', 'updated_at', 'id'),)
+    
+    # Normalized tags used for filtering; the tags column keeps the text shown in the form
+    tag_objects = db.relationship('Tag', secondary=note_tags, lazy=True)
+    
     @property
     def tag_list(self):
         """Return list of tags"""
@@ -65,9 +173,226 @@ class Note(db.Model):
             return [tag.strip() for tag in self.tags.split(',') if tag.strip()]
         return []
     
+    def set_tags(self, tags):
+        """Set tags from comma-separated text and sync Tag rows and their counts"""
+        self.tags = tags
+        names = list(dict.fromkeys(name[:100] for name in self.tag_list))
+        current = {tag.name: tag for tag in self.tag_objects}
+        
+        for name, tag in current.items():
+            if name not in names:
+                self.tag_objects.remove(tag)
+                tag.note_count = Tag.note_count - 1
+        
+        for name in names:
+            if name in current:
+                continue
+            # A concurrent request may create the same new tag first
+            tag, _ = get_or_create(
+                Tag,
+                lambda: Tag(user_id=self.user_id, name=name, note_count=0),
+                user_id=self.user_id,
+                name=name
+            )
+            tag.note_count = Tag.note_count + 1
+            self.tag_objects.append(tag)
+    
     def __repr__(self):
         return f'<Note {self.title}>'
 
+def backfill_note_tags():
+    """Create Tag rows for notes that only have the comma-separated tags text"""
+    notes = Note.query.filter(
+        Note.tags.isnot(None),
+        Note.tags != '',
+        ~Note.tag_objects.any()
+    ).all()
+    for note in notes:
+        note.set_tags(note.tags)
+        db.session.flush()
+    db.session.commit()
+    return len(notes)
+
+class UserStats(db.Model):
+    """Per-user dashboard totals, updated incrementally on every session and note write"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    total_sessions = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+    total_notes = db.Column(db.Integer, nullable=False, default=0)
+    current_streak = db.Column(db.Integer, nullable=False, default=0)  # consecutive study days
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_study_date = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @classmethod
+    def for_user(cls, user_id):
+        """Return the user's stats, building them from history on first access"""
+        stats, _ = get_or_create(cls, lambda: cls(user_id=user_id).load_history(), user_id=user_id)
+        return stats
+    
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recompute the user's stats from StudySession and Note rows"""
+        stats = db.session.get(cls, user_id)
+        if stats is None:
+            return cls.for_user(user_id)
+        return stats.load_history()
+    
+    def load_history(self):
+        """Fill totals and streaks from existing rows (one-off backfill)"""
+        sessions, minutes = db.session.query(
+            db.func.count(StudySession.id),
+            db.func.coalesce(db.func.sum(StudySession.duration_minutes), 0)
+        ).filter(StudySession.user_id == self.user_id).one()
+        self.total_sessions = sessions
+        self.total_minutes = minutes
+        self.total_notes = Note.query.filter_by(user_id=self.user_id).count()
+        self.current_streak = 0
+        self.longest_streak = 0
+        self.last_study_date = None
+        days = db.session.query(db.func.date(StudySession.created_at)).filter(
+            StudySession.user_id == self.user_id
+        ).distinct().order_by(db.func.date(StudySession.created_at)).all()
+        for (day,) in days:
+            if isinstance(day, str):
+                day = datetime.strptime(day, '%Y-%m-%d').date()
+            self._count_study_day(day)
+        return self
+    
+    @property
+    def active_streak(self):
+        """Current streak, or 0 when the user did not study today or yesterday"""
+        if self.last_study_date is None:
+            return 0
+        if self.last_study_date < datetime.utcnow().date() - timedelta(days=1):
+            return 0
+        return self.current_streak
+    
+    def record_session(self, duration_minutes, when=None):
+        """Account for a new study session"""
+        # SQL increments so concurrent writers do not lose updates
+        self.total_sessions = UserStats.total_sessions + 1
+        self.record_minutes(duration_minutes, when)
+    
+    def record_minutes(self, duration_minutes, when=None):
+        """Account for time added to an existing study session"""
+        self.total_minutes = UserStats.total_minutes + duration_minutes
+        self._count_study_day((when or datetime.utcnow()).date())
+    
+    def record_note(self, delta=1):
+        """Account for a created (+1) or deleted (-1) note"""
+        self.total_notes = UserStats.total_notes + delta
+    
+    def _count_study_day(self, day):
+        if self.last_study_date is not None and day <= self.last_study_date:
+            return
+        if self.last_study_date is not None and day - self.last_study_date == timedelta(days=1):
+            self.current_streak = (self.current_streak or 0) + 1
+        else:
+            self.current_streak = 1
+        self.longest_streak = max(self.longest_streak or 0, self.current_streak)
+        self.last_study_date = day
+    
+    def __repr__(self):
+        return f'<UserStats {self.user_id}>'
+
+class DailyStudyRollup(db.Model):
+    """Per-user, per-day and per-subject study totals backing the analytics charts"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    subject = db.Column(db.String(100), nullable=False, default='')  # '' for uploaded files
+    study_minutes = db.Column(db.Integer, nullable=False, default=0)
+    sessions_count = db.Column(db.Integer, nullable=False, default=0)
+    questions_answered = db.Column(db.Integer, nullable=False, default=0)
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Range queries filter on (user_id, day), so the unique index serves them too
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', 'subject', name='user_day_subject_unique'),)
+    
+    @classmethod
+    def record(cls, user_id, day, subject, minutes=0, sessions=0, questions=0, correct=0):
+        """Add to the rollup row of the given day and subject, creating it if needed"""
+        rollup, _ = get_or_create(
+            cls,
+            lambda: cls(user_id=user_id, day=day, subject=subject or ''),
+            user_id=user_id,
+            day=day,
+            subject=subject or ''
+        )
+        # SQL increments so concurrent writers do not lose updates
+        rollup.study_minutes = cls.study_minutes + minutes
+        rollup.sessions_count = cls.sessions_count + sessions
+        rollup.questions_answered = cls.questions_answered + questions
+        rollup.correct_answers = cls.correct_answers + correct
+        return rollup
+    
+    def __repr__(self):
+        return f'<DailyStudyRollup {self.user_id} {self.day} {self.subject}>'
+
+def backfill_daily_rollups():
+    """Build rollups for users whose sessions predate the rollup table
+
+    Legacy study_session.questions_answered holds the number of generated
+    questions, not answers, so answered/correct start at 0 for these days.
+    """
+    user_ids = [user_id for (user_id,) in db.session.query(StudySession.user_id).distinct().filter(
+        ~db.exists().where(DailyStudyRollup.user_id == StudySession.user_id)
+    )]
+    for user_id in user_ids:
+        day = db.func.date(StudySession.created_at)
+        rows = db.session.query(
+            day,
+            db.func.coalesce(StudySession.subject, ''),
+            db.func.sum(StudySession.duration_minutes),
+            db.func.count(StudySession.id)
+        ).filter(StudySession.user_id == user_id).group_by(day, db.func.coalesce(StudySession.subject, '')).all()
+        for row_day, subject, minutes, sessions in rows:
+            if isinstance(row_day, str):
+                row_day = datetime.strptime(row_day, '%Y-%m-%d').date()
+            db.session.add(DailyStudyRollup(
+                user_id=user_id,
+                day=row_day,
+                subject=subject,
+                study_minutes=minutes or 0,
+                sessions_count=sessions,
+                questions_answered=0,
+                correct_answers=0
+            ))
+    db.session.commit()
+    return len(user_ids)
+
+def migrate_analysis_payloads(batch_size=200):
+    """Add study_session.payload_id to old databases and move inline JSON into AnalysisPayload"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('study_session')}
+    if 'payload_id' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE study_session ADD COLUMN payload_id INTEGER REFERENCES analysis_payload (id)'))
+    
+    moved = 0
+    while True:
+        sessions = StudySession.query.options(db.undefer(StudySession.materials_analyzed)).filter(
+            StudySession.materials_analyzed.isnot(None)
+        ).limit(batch_size).all()
+        if not sessions:
+            break
+        for session in sessions:
+            try:
+                session.payload = AnalysisPayload.store(json.loads(session.materials_analyzed))
+            except ValueError:
+                pass  # Unreadable legacy JSON is dropped
+            session.materials_analyzed = None
+        db.session.commit()
+        moved += len(sessions)
+    return moved
+
+def create_missing_indexes():
+    """Create indexes that db.create_all() skips on already existing tables"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
 class UserProgress(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -75,25 +400,296 @@ class UserProgress(db.Model):
     total_study_time = db.Column(db.Integer, default=0)  # in minutes
     sessions_count = db.Column(db.Integer, default=0)
     average_accuracy = db.Column(db.Float, default=0.0)
+    questions_answered = db.Column(db.Integer, nullable=False, default=0)  # Reviewed cards
+    correct_answers = db.Column(db.Integer, nullable=False, default=0)
     last_activity = db.Column(db.DateTime, default=datetime.utcnow)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Make sure user can have only one progress record per subject
     __table_args__ = (db.UniqueConstraint('user_id', 'subject', name='user_subject_unique'),)
     
-    def update_progress(self, session_duration, accuracy):
+    def update_progress(self, session_duration, answered=0, correct=0):
         """Update progress based on new study session"""
         self.sessions_count += 1
-        self.total_study_time += session_duration
+        self.record_answers(answered, correct, session_duration)
+    
+    def record_answers(self, answered, correct, minutes=0):
+        """Add answers and study time without counting a new session"""
+        self.total_study_time += minutes
         
-        # Calculate new average accuracy
-        if self.sessions_count == 1:
-            self.average_accuracy = accuracy
-        else:
-            # Weighted average with previous accuracy
-            self.average_accuracy = ((self.average_accuracy * (self.sessions_count - 1)) + accuracy) / self.sessions_count
+        # Accuracy over all answered cards, sessions without answers do not change it
+        if answered:
+            self.questions_answered = (self.questions_answered or 0) + answered
+            self.correct_answers = (self.correct_answers or 0) + correct
+            self.average_accuracy = self.correct_answers / self.questions_answered * 100
         
         self.last_activity = datetime.utcnow()
     
     def __repr__(self):
-        return f'<UserProgress {self.subject}>'
\ No newline at end of file
+        return f'<UserProgress {self.subject}>'
+
+class AnalysisJob(db.Model):
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    subject = db.Column(db.String(100), nullable=True)
+    topic = db.Column(db.String(200), nullable=True)
+    source_name = db.Column(db.String(255), nullable=True)  # Original filename of the upload
+    source_data = db.deferred(db.Column(db.LargeBinary, nullable=True))  # Upload bytes, cleared once processed
+    source_hash = db.Column(db.String(64), nullable=True)  # SHA-256 of the upload, key of the extracted text store
+    source_text = db.deferred(db.Column(db.Text, nullable=True))  # Already extracted text instead of the bytes, cleared once processed
+    # Legacy inline JSON, moved to AnalysisPayload by migrate_job_payloads
+    result = db.deferred(db.Column(db.Text, nullable=True))
+    payload_id = db.Column(db.Integer, db.ForeignKey('analysis_payload.id'), nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+    
+    payload = db.relationship('AnalysisPayload')
+    
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+    
+    @property
+    def analysis_result(self):
+        """Decoded analysis result, or None while the job is not done"""
+        if self.payload is not None:
+            return self.payload.result
+        if self.result:
+            return json.loads(self.result)
+        return None
+    
+    def to_dict(self):
+        """Serialize job state for the status endpoint"""
+        data = {'job_id': self.id, 'status': self.status}
+        if self.status == 'done':
+            result = self.analysis_result
+            if result is not None:
+                data['result'] = result
+        if self.status == 'failed':
+            data['error'] = self.error
+        return data
+    
+    def __repr__(self):
+        return f'<AnalysisJob {self.id} {self.status}>'
+
+class CatalogueAnalysis(db.Model):
+    """Precomputed analysis of a study_materials.json topic (see catalogue.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(100), nullable=False)
+    topic = db.Column(db.String(200), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)  # Hash of topic text, model and prompt version
+    model = db.Column(db.String(100), nullable=False)
+    payload_id = db.Column(db.Integer, db.ForeignKey('analysis_payload.id'), nullable=False)
+    analyzed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    payload = db.relationship('AnalysisPayload', lazy='joined')
+    
+    __table_args__ = (
+        db.UniqueConstraint('subject', 'topic', name='uq_catalogue_analysis_topic'),
+    )
+    
+    @classmethod
+    def store(cls, subject, topic, content_hash, model, result):
+        """Insert or replace the stored analysis of the topic"""
+        row, _ = get_or_create(
+            cls,
+            lambda: cls(subject=subject, topic=topic, content_hash=content_hash, model=model,
+                        payload=AnalysisPayload.store(result)),
+            subject=subject, topic=topic
+        )
+        row.content_hash = content_hash
+        row.model = model
+        row.payload = AnalysisPayload.store(result)
+        row.analyzed_at = datetime.utcnow()
+        return row
+    
+    def __repr__(self):
+        return f'<CatalogueAnalysis {self.subject} / {self.topic}>'
+
+class Flashcard(db.Model):
+    """Flashcard or quiz question from an analysis result, scheduled for review by srs.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    session_id = db.Column(db.Integer, db.ForeignKey('study_session.id'), nullable=True)  # Session that produced the card
+    subject = db.Column(db.String(100), nullable=True)
+    topic = db.Column(db.String(200), nullable=False)
+    kind = db.Column(db.String(20), nullable=False, default='flashcard')  # flashcard or question
+    front = db.Column(db.Text, nullable=False)
+    back = db.Column(db.Text, nullable=False)  # Answer, or the correct letter of a question
+    options = db.Column(db.Text, nullable=True)  # JSON list of choices for questions
+    content_hash = db.Column(db.String(64), nullable=False)
+    ease_factor = db.Column(db.Float, nullable=False, default=srs.INITIAL_EASE)
+    interval_days = db.Column(db.Integer, nullable=False, default=0)
+    repetitions = db.Column(db.Integer, nullable=False, default=0)  # Successful reviews in a row
+    lapses = db.Column(db.Integer, nullable=False, default=0)
+    due_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_reviewed_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # The due queue (user_id = ? AND due_at <= now ORDER BY due_at) is a range scan on this index
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'content_hash', name='uq_flashcard_user_content'),
+        db.Index('ix_flashcard_user_due', 'user_id', 'due_at'),
+    )
+    
+    @staticmethod
+    def hash_content(kind, front, back):
+        text = '\n'.join(' '.join(part.split()).lower() for part in (kind, front, back))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def cards_from_result(cls, result):
+        """Yield (kind, front, back, options) for the questions and flashcards of an analysis result"""
+        for item in result.get('flashcards') or []:
+            if isinstance(item, dict) and item.get('question') and item.get('answer'):
+                yield 'flashcard', item['question'], item['answer'], None
+        for item in result.get('questions') or []:
+            if isinstance(item, dict) and item.get('question') and item.get('options') and item.get('correct'):
+                yield 'question', item['question'], item['correct'], item['options']
+    
+    @classmethod
+    def add_from_result(cls, user_id, session, subject, topic, result):
+        """Create cards for the user that they do not have yet; returns the number of new cards"""
+        cards = {}
+        for kind, front, back, options in cls.cards_from_result(result):
+            content_hash = cls.hash_content(kind, front, back)
+            cards.setdefault(content_hash, cls(
+                user_id=user_id,
+                session_id=session.id if session is not None else None,
+                subject=subject,
+                topic=topic or 'Nespecifikované téma',
+                kind=kind,
+                front=front,
+                back=back,
+                options=json.dumps(options, ensure_ascii=False) if options else None,
+                content_hash=content_hash
+            ))
+        if not cards:
+            return 0
+        existing = {content_hash for (content_hash,) in db.session.query(cls.content_hash).filter(
+            cls.user_id == user_id, cls.content_hash.in_(list(cards))
+        )}
+        new_cards = [card for content_hash, card in cards.items() if content_hash not in existing]
+        try:
+            with db.session.begin_nested():
+                db.session.add_all(new_cards)
+        except IntegrityError:
+            # A concurrent analysis of the same topic inserted some of the cards first
+            added = 0
+            for card in new_cards:
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(card)
+                    added += 1
+                except IntegrityError:
+                    pass
+            return added
+        return len(new_cards)
+    
+    @classmethod
+    def due_query(cls, user_id, now=None):
+        return cls.query.filter(cls.user_id == user_id, cls.due_at <= (now or datetime.utcnow()))
+    
+    @classmethod
+    def due(cls, user_id, limit=20, now=None):
+        """Cards due for review, the most overdue first"""
+        return cls.due_query(user_id, now).order_by(cls.due_at, cls.id).limit(limit).all()
+    
+    @property
+    def option_list(self):
+        return json.loads(self.options) if self.options else []
+    
+    def review(self, grade, now=None):
+        """Reschedule the card after an answer with the given grade (0-5)"""
+        now = now or datetime.utcnow()
+        if not srs.is_correct(grade) and self.repetitions:
+            self.lapses += 1
+        self.ease_factor, self.interval_days, self.repetitions, self.due_at = srs.schedule(
+            self.ease_factor, self.interval_days, self.repetitions, grade, now
+        )
+        self.last_reviewed_at = now
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'subject': self.subject,
+            'topic': self.topic,
+            'front': self.front,
+            'back': self.back,
+            'options': self.option_list,
+            'due_at': self.due_at.isoformat(),
+            'interval_days': self.interval_days,
+        }
+    
+    def __repr__(self):
+        return f'<Flashcard {self.kind} {self.id}>'
+
+def add_flashcard_columns():
+    """Add the accuracy counters to user_progress on old databases"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('user_progress')}
+    with db.engine.begin() as conn:
+        for name in ('questions_answered', 'correct_answers'):
+            if name not in columns:
+                conn.execute(db.text(f'ALTER TABLE user_progress ADD COLUMN {name} INTEGER NOT NULL DEFAULT 0'))
+
+def add_job_source_hash():
+    """Add the upload hash column to analysis_job on old databases"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('analysis_job')}
+    if 'source_hash' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE analysis_job ADD COLUMN source_hash VARCHAR(64)'))
+
+def add_job_source_text():
+    """Add the extracted text column to analysis_job on old databases"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('analysis_job')}
+    if 'source_text' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE analysis_job ADD COLUMN source_text TEXT'))
+
+def migrate_job_payloads(batch_size=200):
+    """Add analysis_job.payload_id to old databases and move inline result JSON into AnalysisPayload"""
+    columns = {column['name'] for column in db.inspect(db.engine).get_columns('analysis_job')}
+    if 'payload_id' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(db.text('ALTER TABLE analysis_job ADD COLUMN payload_id INTEGER REFERENCES analysis_payload (id)'))
+    
+    moved = 0
+    while True:
+        jobs = AnalysisJob.query.options(db.undefer(AnalysisJob.result)).filter(
+            AnalysisJob.result.isnot(None)
+        ).limit(batch_size).all()
+        if not jobs:
+            break
+        for job in jobs:
+            try:
+                result = json.loads(job.result)
+            except ValueError:
+                result = None  # Unreadable legacy JSON is dropped
+            if job.status == 'done' and result is not None:
+                job.payload = AnalysisPayload.store(result)
+            job.result = None
+        db.session.commit()
+        moved += len(jobs)
+    return moved
+
+def backfill_flashcards(batch_size=200):
+    """Extract cards from analysis results stored before the flashcard table existed"""
+    last_id = 0
+    added = 0
+    while True:
+        sessions = StudySession.query.filter(
+            StudySession.id > last_id, StudySession.payload_id.isnot(None)
+        ).order_by(StudySession.id).limit(batch_size).all()
+        if not sessions:
+            break
+        for session in sessions:
+            added += Flashcard.add_from_result(
+                session.user_id, session, session.subject, session.topic, session.analysis_result
+            )
+        db.session.commit()
+        last_id = sessions[-1].id
+    return added
@@ -0,0 +1,93 @@
+"""Stránkování seznamů pomocí kurzoru.
+
+Seznamy řazené od nejnovějších používají keyset stránkování podle dvojice
+(čas, id): další stránka začíná za posledním řádkem předchozí, takže
+dotaz jde rovnou po indexu a jeho cena nezávisí na tom, jak daleko už
+uživatel doscrolloval. Kurzor je pro klienta neprůhledný řetězec.
+Výsledky hledání řazené podle relevance nemají stabilní klíč, jejich
+kurzor proto nese jen posun.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.engine import Row
+
+
+class Page:
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(data):
+    raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Rozbalí kurzor; při neplatném vyhodí ValueError"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Neplatný kurzor')
+    if not isinstance(data, dict):
+        raise ValueError('Neplatný kurzor')
+    return data
+
+
+def _entity(row):
+    return row[0] if isinstance(row, Row) else row
+
+
+def keyset_page(query, order_column, id_column, cursor=None, limit=20):
+    """Stránka řádků seřazených sestupně podle (order_column, id_column).
+
+    ``cursor`` je řetězec z ``Page.next_cursor`` předchozí stránky. Řádky
+    mohou být entity i n-tice, klíč se čte z první entity v řádku.
+    """
+    data = decode_cursor(cursor)
+    if data is not None:
+        try:
+            last_value = datetime.fromisoformat(data['v'])
+            last_id = int(data['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Neplatný kurzor')
+        query = query.filter(or_(
+            order_column < last_value,
+            and_(order_column == last_value, id_column < last_id)
+        ))
+    rows = query.order_by(order_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows)
+    rows = rows[:limit]
+    last = _entity(rows[-1])
+    return Page(rows, encode_cursor({
+        'v': getattr(last, order_column.key).isoformat(),
+        'id': getattr(last, id_column.key),
+    }))
+
+
+def offset_page(query, cursor=None, limit=20):
+    """Stránka dotazu s vlastním řazením (např. podle relevance)"""
+    data = decode_cursor(cursor)
+    offset = 0
+    if data is not None:
+        try:
+            offset = int(data['o'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('Neplatný kurzor')
+        if offset < 0:
+            raise ValueError('Neplatný kurzor')
+    rows = query.offset(offset).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows)
+    return Page(rows[:limit], encode_cursor({'o': offset + limit}))
@@ -0,0 +1,99 @@
+"""Hashování hesel bcryptem mimo vlákno requestu.
+
+bcrypt je záměrně pomalý a přímo ve view by každé přihlášení blokovalo
+worker serveru. Hashování a ověřování proto běží v omezeném poolu procesů;
+když na pool čeká příliš mnoho požadavků déle než ``timeout``, vyhodí se
+PasswordHasherBusy a view odpoví 503. Cena (počet kol bcryptu) se nastavuje
+přes BCRYPT_ROUNDS, hesla uložená s jinou cenou se přehashují při
+příštím přihlášení.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+
+class PasswordHasherBusy(Exception):
+    """Pool pro hashování je přetížený, klient to má zkusit později"""
+
+
+def _hash(password, rounds):
+    """Zahashuje heslo (běží v podřízeném procesu)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    """Ověří heslo proti hashi (běží v podřízeném procesu)"""
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def hash_rounds(hashed):
+    """Cena uložená v hashi ve tvaru $2b$12$..., nebo None"""
+    parts = hashed.split('$')
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """bcrypt v poolu procesů s omezenou frontou.
+
+    Při ``max_workers=0`` se hashuje přímo ve volajícím vlákně (skripty,
+    ladění). Pool se vytvoří až při prvním použití.
+    """
+
+    def __init__(self, rounds=12, max_workers=2, max_pending=None, timeout=10.0):
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self.configure(rounds, max_workers, max_pending, timeout)
+
+    def configure(self, rounds=12, max_workers=2, max_pending=None, timeout=10.0):
+        if not MIN_ROUNDS <= rounds <= MAX_ROUNDS:
+            raise ValueError(f'BCRYPT_ROUNDS musí být mezi {MIN_ROUNDS} a {MAX_ROUNDS}')
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.timeout = timeout
+        if max_pending is None:
+            max_pending = max_workers * 8
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending) if max_workers else None
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        return self._run(_check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """Byl hash vytvořen s jinou cenou, než je nastavená?"""
+        return hash_rounds(hashed) != self.rounds
+
+    def shutdown(self, wait=True):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+
+    def _run(self, function, *args):
+        if not self.max_workers:
+            return function(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy('Příliš mnoho požadavků na ověření hesla')
+        try:
+            return self._get_pool().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+
+# Sdílený hasher, nastavuje ho aplikace podle konfigurace
+password_hasher = PasswordHasher(max_workers=min(4, os.cpu_count() or 1))
@@ -0,0 +1,85 @@
+"""Omezení počtu pokusů o přihlášení.
+
+Počitadla jsou v paměti procesu, takže při běhu ve více procesech platí
+limity pro každý proces zvlášť. Pokusy se odmítají ještě před ověřením
+hesla, takže útok hrubou silou nezahltí pool pro hashování hesel.
+
+Počítají se jen neúspěšná přihlášení. Celá třída za jednou NAT adresou
+se tak přihlásí bez omezení. Limit na uživatelské jméno platí pro dvojici
+(jméno, IP adresa), takže cizí klient nemůže uživateli zablokovat účet.
+"""
+import threading
+import time
+from collections import deque
+
+
+class SlidingWindowLimiter:
+    """Nejvýše ``limit`` událostí za posledních ``window`` sekund pro každý klíč"""
+
+    def __init__(self, limit, window, max_keys=100000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                if len(self._events) >= self.max_keys:
+                    self._purge(now)
+                events = self._events[key] = deque()
+            self._expire(events, now)
+            events.append(now)
+
+    def retry_after(self, key, now=None):
+        """Za kolik sekund bude další událost povolena (0 = hned)"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            events = self._events.get(key)
+            if not events:
+                return 0
+            self._expire(events, now)
+            if len(events) < self.limit:
+                return 0
+            return max(0, events[-self.limit] + self.window - now)
+
+    def reset(self, key):
+        with self._lock:
+            self._events.pop(key, None)
+
+    def _expire(self, events, now):
+        while events and events[0] <= now - self.window:
+            events.popleft()
+
+    def _purge(self, now):
+        for key in list(self._events):
+            events = self._events[key]
+            self._expire(events, now)
+            if not events:
+                del self._events[key]
+
+
+class LoginRateLimiter:
+    """Limity neúspěšných přihlášení na (uživatelské jméno, IP adresu) a na IP adresu"""
+
+    def __init__(self, max_failures=5, failure_window=900, max_failures_per_ip=100, ip_window=300):
+        self.failures = SlidingWindowLimiter(max_failures, failure_window)
+        self.ip_failures = SlidingWindowLimiter(max_failures_per_ip, ip_window)
+
+    def retry_after(self, username, ip):
+        """Počet sekund, po které je přihlášení zablokované (0 = povoleno)"""
+        return max(self.failures.retry_after(self._user_key(username, ip)), self.ip_failures.retry_after(ip))
+
+    def record_failure(self, username, ip):
+        self.failures.hit(self._user_key(username, ip))
+        self.ip_failures.hit(ip)
+
+    def record_success(self, username, ip):
+        self.failures.reset(self._user_key(username, ip))
+
+    @staticmethod
+    def _user_key(username, ip):
+        return (username or '').strip().lower(), ip
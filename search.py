@@ -0,0 +1,118 @@
+"""Fulltextové vyhledávání v poznámkách (SQLite FTS5).
+
+Index ``note_fts`` je externí obsahová tabulka nad ``note``, kterou
+udržují v synchronizaci databázové triggery, takže funguje pro všechny
+zápisy bez ohledu na to, odkud přišly. Tokenizer odstraňuje diakritiku,
+hledání "poznamka" tedy najde i "poznámka". Na jiných databázích než
+SQLite se použije pomalejší hledání přes LIKE.
+"""
+import re
+
+from markupsafe import Markup, escape
+from sqlalchemy import column, false, func, literal, literal_column, table, text
+
+from models import Note
+
+# Neviditelné značky pro zvýraznění, po escapování HTML se nahradí <mark>
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+# Váhy sloupců pro BM25: název, obsah, tagy
+BM25_WEIGHTS = (10.0, 1.0, 5.0)
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_FTS_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5(
+        title, content, tags,
+        content='note', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_insert AFTER INSERT ON note BEGIN
+        INSERT INTO note_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_delete AFTER DELETE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS note_fts_update AFTER UPDATE ON note BEGIN
+        INSERT INTO note_fts(note_fts, rowid, title, content, tags)
+        VALUES ('delete', old.id, old.title, old.content, old.tags);
+        INSERT INTO note_fts(rowid, title, content, tags)
+        VALUES (new.id, new.title, new.content, new.tags);
+    END""",
+]
+
+_fts_enabled = None
+
+
+def install_note_search(db):
+    """Vytvoří FTS index a triggery; nový index naplní z existujících poznámek"""
+    global _fts_enabled
+    if db.engine.dialect.name != 'sqlite':
+        _fts_enabled = False
+        return False
+    with db.engine.begin() as conn:
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_fts'"
+        )).first()
+        for statement in _FTS_SCHEMA:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO note_fts(note_fts) VALUES ('rebuild')"))
+    _fts_enabled = True
+    return True
+
+
+def fts_enabled(db):
+    """Je FTS index k dispozici? (výsledek se pamatuje pro celý proces)"""
+    global _fts_enabled
+    if _fts_enabled is None:
+        if db.engine.dialect.name != 'sqlite':
+            _fts_enabled = False
+        else:
+            with db.engine.connect() as conn:
+                _fts_enabled = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_fts'"
+                )).first() is not None
+    return _fts_enabled
+
+
+def build_match_expression(search):
+    """Převede uživatelský dotaz na FTS5 výraz: všechna slova, jako prefixy"""
+    tokens = _TOKEN_RE.findall(search)
+    return ' '.join(f'"{token}"*' for token in tokens) or None
+
+
+def apply_search(db, query, search):
+    """Omezí dotaz na poznámky odpovídající hledání a seřadí je podle relevance.
+
+    K výsledku přidá sloupec ``snippet`` s úryvkem, ve kterém jsou
+    nalezená slova ohraničena značkami MARK_START/MARK_END.
+    """
+    if not fts_enabled(db):
+        return query.filter(
+            Note.title.contains(search) | Note.content.contains(search)
+        ).add_columns(literal(None).label('snippet')).order_by(Note.updated_at.desc())
+
+    match = build_match_expression(search)
+    if match is None:
+        return query.filter(false()).add_columns(literal(None).label('snippet'))
+
+    fts = table('note_fts', column('rowid'))
+    fts_column = literal_column('note_fts')
+    snippet = func.snippet(fts_column, -1, MARK_START, MARK_END, '…', 24).label('snippet')
+    return (
+        query.join(fts, fts.c.rowid == Note.id)
+        .filter(fts_column.op('MATCH')(match))
+        .add_columns(snippet)
+        .order_by(func.bm25(fts_column, *BM25_WEIGHTS))
+    )
+
+
+def highlight_snippet(snippet):
+    """Bezpečné HTML úryvku se zvýrazněnými nalezenými slovy"""
+    if not snippet:
+        return Markup('')
+    return escape(snippet).replace(MARK_START, Markup('<mark>')).replace(MARK_END, Markup('</mark>'))
@@ -0,0 +1,331 @@
+"""Sémantické hledání v poznámkách a tématech katalogu.
+
+Texty se převádí na vektory lokálně, bez sítě a bez stahování modelu.
+Slova (bez diakritiky) a jejich znakové trigramy se hashují se znaménkem
+do ``dim`` dimenzí a vektor se normalizuje. Trigramy spojí i různé tvary
+téhož slova (derivace, derivací, derivaci). Podobnost je kosinová, tedy
+skalární součin normalizovaných vektorů.
+
+Vektory poznámek jsou výchozně jen v paměti a při prvním použití se
+dopočítají z databáze. S VECTOR_INDEX_PATH jsou v souborech mapovaných do
+paměti (numpy.memmap), po restartu se nepočítají znovu. Při vytvoření,
+úpravě či smazání poznámky se přepíše jen její řádek. Dotaz počítá skóre
+po blocích řádků jedním maticovým násobením pro všechny dotazy najednou a
+nejlepších k vybírá přes argpartition. Soubory se nezamykají a nenačítají
+znovu po zápisu jiného procesu, proto je smí používat jen jeden proces
+aplikace; při běhu ve více procesech nechte VECTOR_INDEX_PATH prázdné.
+"""
+import math
+import os
+import re
+import threading
+import unicodedata
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from models import db, Note
+
+EMBEDDING_DIM = 256
+
+_TOKEN_RE = re.compile(r'\w+')
+# Nejčastější slova bez významu pro podobnost (už bez diakritiky)
+_STOPWORDS = frozenset(
+    'je jsou byl bylo se si na ve do za po od pro pri jak ale tak ten ta to tu ty jeho jej '
+    'ktery ktera ktere kde kdy nebo take jako jen uz co by aby ze the and of in is to for'.split()
+)
+_META_DTYPE = np.dtype([('item_id', '<i8'), ('owner_id', '<i8'), ('updated', '<f8')])
+
+
+def _fold(text):
+    """Malá písmena bez diakritiky"""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+@lru_cache(maxsize=200000)
+def _word_features(word, dim):
+    """Indexy a váhy (se znaménkem) slova a jeho trigramů"""
+    padded = f'#{word}#'
+    grams = [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    hashes = np.array([zlib.crc32(gram.encode('utf-8')) for gram in grams], dtype=np.uint32)
+    weights = np.full(len(grams), 0.5, dtype=np.float32)
+    weights[0] = 1.0
+    signs = np.where(hashes & 0x80000000, 1.0, -1.0).astype(np.float32)
+    return (hashes % dim).astype(np.intp), weights * signs
+
+
+def embed(text, dim=EMBEDDING_DIM):
+    """Normalizovaný vektor textu (nulový, když text nemá žádná slova)"""
+    words = Counter(
+        word for word in _TOKEN_RE.findall(_fold(text or ''))
+        if len(word) > 1 and not word.isdigit() and word not in _STOPWORDS
+    )
+    vector = np.zeros(dim, dtype=np.float32)
+    for word, count in words.items():
+        indexes, weights = _word_features(word, dim)
+        np.add.at(vector, indexes, weights * (1.0 + math.log(count)))
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def top_k(vectors, queries, k, valid=None, block_rows=16384):
+    """Řádky s nejvyšším skóre pro každý dotaz: [[(řádek, skóre), ...], ...].
+
+    ``vectors`` může být memmap, čte se po blocích ``block_rows`` řádků.
+    ``valid(start, end)`` vrací masku řádků bloku, které se mají brát v úvahu.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    best_rows = np.empty((len(queries), 0), dtype=np.intp)
+    for start in range(0, len(vectors), block_rows):
+        end = min(len(vectors), start + block_rows)
+        mask = valid(start, end) if valid is not None else None
+        if mask is not None and not mask.any():
+            continue
+        if mask is not None and mask.sum() * 4 < len(mask):
+            # Málo platných řádků (poznámky jednoho z mnoha uživatelů): násobí se jen ty
+            block_rows_used = np.flatnonzero(mask)
+            scores = queries @ np.asarray(vectors[start:end])[block_rows_used].T
+            rows = np.broadcast_to(block_rows_used + start, scores.shape)
+        else:
+            scores = queries @ np.asarray(vectors[start:end]).T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), scores.shape)
+        best_scores = np.concatenate([best_scores, scores], axis=1)
+        best_rows = np.concatenate([best_rows, rows], axis=1)
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    return [
+        [(int(row), float(score)) for row, score in zip(rows, scores) if score > 0]
+        for rows, scores in zip(best_rows, best_scores)
+    ]
+
+
+class VectorIndex:
+    """Vektory položek (např. poznámek) s vlastníkem, uložené v ``<path>.vec`` a ``<path>.meta``.
+
+    Smazané řádky mají ``item_id`` 0 a znovu se použijí. Při ``path=None``
+    jsou vektory jen v paměti.
+    """
+
+    def __init__(self, path=None, dim=EMBEDDING_DIM, initial_capacity=1024):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._free = []
+        self._size = 0
+        self._vectors = None
+        self._meta = None
+        self._open(initial_capacity)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _files(self):
+        return self.path + '.vec', self.path + '.meta'
+
+    def _open(self, initial_capacity):
+        if self.path is None:
+            self._vectors = np.zeros((initial_capacity, self.dim), dtype=np.float32)
+            self._meta = np.zeros(initial_capacity, dtype=_META_DTYPE)
+            return
+        vec_file, meta_file = self._files()
+        capacity = os.path.getsize(meta_file) // _META_DTYPE.itemsize if os.path.exists(meta_file) else 0
+        expected = capacity * self.dim * 4
+        if not capacity or not os.path.exists(vec_file) or os.path.getsize(vec_file) != expected:
+            # Chybějící index nebo jiná dimenze: začne se znovu, naplní ho sync
+            capacity = initial_capacity
+            os.makedirs(os.path.dirname(os.path.abspath(vec_file)), exist_ok=True)
+            for name, itemsize in ((vec_file, self.dim * 4), (meta_file, _META_DTYPE.itemsize)):
+                with open(name, 'wb') as f:
+                    f.truncate(capacity * itemsize)
+        self._map(capacity)
+        item_ids = np.asarray(self._meta['item_id'])
+        used = np.flatnonzero(item_ids)
+        self._rows = {int(item_ids[row]): int(row) for row in used}
+        self._size = int(used[-1]) + 1 if len(used) else 0
+        self._free = [int(row) for row in np.flatnonzero(item_ids[:self._size] == 0)]
+
+    def _map(self, capacity):
+        vec_file, meta_file = self._files()
+        self._vectors = np.memmap(vec_file, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._meta = np.memmap(meta_file, dtype=_META_DTYPE, mode='r+', shape=(capacity,))
+
+    def _grow(self):
+        capacity = len(self._meta) * 2
+        if self.path is None:
+            vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+            meta = np.zeros(capacity, dtype=_META_DTYPE)
+            vectors[:len(self._vectors)] = self._vectors
+            meta[:len(self._meta)] = self._meta
+            self._vectors, self._meta = vectors, meta
+            return
+        self.flush()
+        for name, itemsize in zip(self._files(), (self.dim * 4, _META_DTYPE.itemsize)):
+            with open(name, 'r+b') as f:
+                f.truncate(capacity * itemsize)
+        self._map(capacity)
+
+    def upsert(self, item_id, owner_id, vector, updated=0.0):
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                if self._free:
+                    row = self._free.pop()
+                else:
+                    if self._size == len(self._meta):
+                        self._grow()
+                    row = self._size
+                    self._size += 1
+                self._rows[item_id] = row
+            self._vectors[row] = vector
+            self._meta[row] = (item_id, owner_id, updated)
+
+    def remove(self, item_id):
+        with self._lock:
+            row = self._rows.pop(item_id, None)
+            if row is None:
+                return False
+            self._meta[row] = (0, 0, 0.0)
+            self._vectors[row] = 0
+            self._free.append(row)
+            return True
+
+    def vector(self, item_id):
+        row = self._rows.get(item_id)
+        return None if row is None else np.array(self._vectors[row])
+
+    def versions(self):
+        """{item_id: updated} všech položek v indexu"""
+        with self._lock:
+            return {item_id: float(self._meta[row]['updated']) for item_id, row in self._rows.items()}
+
+    def flush(self):
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+            self._meta.flush()
+
+    def search(self, queries, k=10, owner_id=None, exclude=()):
+        """Nejpodobnější položky pro každý dotaz: [[(item_id, skóre), ...], ...]"""
+        with self._lock:
+            vectors, meta, size = self._vectors, self._meta, self._size
+        exclude = np.fromiter(exclude, dtype=np.int64) if exclude else None
+
+        def valid(start, end):
+            item_ids = meta['item_id'][start:end]
+            mask = item_ids != 0
+            if owner_id is not None:
+                mask &= meta['owner_id'][start:end] == owner_id
+            if exclude is not None:
+                mask &= ~np.isin(item_ids, exclude)
+            return mask
+
+        results = top_k(vectors[:size], queries, k, valid)
+        return [[(int(meta['item_id'][row]), score) for row, score in hits] for hits in results]
+
+
+def note_text(note):
+    return '\n'.join(part for part in (note.title, note.subject, note.tags, note.content) if part)
+
+
+class NoteEmbeddings:
+    """Index vektorů poznámek udržovaný v souladu s tabulkou Note"""
+
+    def __init__(self, index):
+        self.index = index
+        self._synced = False
+        self._sync_lock = threading.Lock()
+
+    def update(self, note):
+        self.index.upsert(note.id, note.user_id, embed(note_text(note), self.index.dim), _timestamp(note.updated_at))
+        self.index.flush()
+
+    def remove(self, note_id):
+        if self.index.remove(note_id):
+            self.index.flush()
+
+    def sync(self, batch_size=1000):
+        """Doplní chybějící a změněné poznámky a odebere smazané; vrací (aktualizováno, odebráno)"""
+        indexed = self.index.versions()
+        stale = []
+        seen = set()
+        for note_id, updated_at in db.session.query(Note.id, Note.updated_at):
+            seen.add(note_id)
+            if indexed.get(note_id) != _timestamp(updated_at):
+                stale.append(note_id)
+        for start in range(0, len(stale), batch_size):
+            for note in Note.query.filter(Note.id.in_(stale[start:start + batch_size])):
+                self.index.upsert(note.id, note.user_id, embed(note_text(note), self.index.dim),
+                                  _timestamp(note.updated_at))
+        removed = [note_id for note_id in indexed if note_id not in seen]
+        for note_id in removed:
+            self.index.remove(note_id)
+        self.index.flush()
+        self._synced = True
+        return len(stale), len(removed)
+
+    def ensure_synced(self):
+        """Při prvním dotazu v procesu dorovná index s databází"""
+        if self._synced:
+            return
+        with self._sync_lock:
+            if not self._synced:
+                self.sync()
+
+    def related(self, note, k=5):
+        """Poznámky téhož uživatele nejpodobnější dané poznámce: [(note_id, skóre)]"""
+        self.ensure_synced()
+        vector = self.index.vector(note.id)
+        if vector is None:
+            vector = embed(note_text(note), self.index.dim)
+        return self.index.search(vector, k, owner_id=note.user_id, exclude={note.id})[0]
+
+    def search(self, user_id, text, k=10):
+        self.ensure_synced()
+        return self.index.search(embed(text, self.index.dim), k, owner_id=user_id)[0]
+
+
+class TopicEmbeddings:
+    """Vektory témat katalogu, přepočítané jen při změně study_materials.json"""
+
+    def __init__(self, materials, dim=EMBEDDING_DIM):
+        self.materials = materials
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._digest = None
+        self._keys = []
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+
+    def _current(self):
+        digest = self.materials.digest()
+        with self._lock:
+            if digest != self._digest:
+                items = self.materials.items()
+                self._keys = [key for key, _ in items]
+                self._vectors = np.array(
+                    [embed(f'{subject} {topic}\n{text}', self.dim) for (subject, topic), text in items],
+                    dtype=np.float32
+                ).reshape(len(items), self.dim)
+                self._digest = digest
+            return self._keys, self._vectors
+
+    def search(self, text, k=5, exclude=()):
+        """Nejpodobnější témata: [((předmět, téma), skóre)]"""
+        keys, vectors = self._current()
+        excluded = np.array([key in exclude for key in keys], dtype=bool)
+        hits = top_k(vectors, embed(text, self.dim), k, lambda start, end: ~excluded[start:end])[0]
+        return [(keys[row], score) for row, score in hits]
+
+
+def _timestamp(value):
+    return value.timestamp() if value is not None else 0.0
@@ -0,0 +1,44 @@
+"""Plánování opakování kartiček (spaced repetition) algoritmem SM-2.
+
+Každá kartička má faktor snadnosti, interval v dnech a počet úspěšných
+opakování v řadě. Po odpovědi se podle známky (0–5) spočítá nový interval
+a čas dalšího opakování ``due_at``. Špatně zodpovězená kartička se vrátí
+za ``RELEARN_MINUTES`` minut a její interval začíná znovu od jednoho dne.
+"""
+from datetime import timedelta
+
+# Známky z tlačítek na stránce opakování
+GRADES = {'again': 1, 'hard': 3, 'good': 4, 'easy': 5}
+PASSING_GRADE = 3
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_MINUTES = 10
+MAX_INTERVAL_DAYS = 365
+
+
+def parse_grade(value):
+    """Známka 0–5 z čísla nebo názvu tlačítka; při neplatné vyhodí ValueError"""
+    if isinstance(value, str) and value in GRADES:
+        return GRADES[value]
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 5:
+        raise ValueError('Neplatná známka')
+    return value
+
+
+def is_correct(grade):
+    return grade >= PASSING_GRADE
+
+
+def schedule(ease, interval_days, repetitions, grade, now):
+    """Vrátí (ease, interval_days, repetitions, due_at) po odpovědi se známkou ``grade``"""
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    if not is_correct(grade):
+        return ease, 0, 0, now + timedelta(minutes=RELEARN_MINUTES)
+    if repetitions == 0:
+        interval_days = 1
+    elif repetitions == 1:
+        interval_days = 6
+    else:
+        interval_days = min(MAX_INTERVAL_DAYS, max(interval_days + 1, round(interval_days * ease)))
+    return ease, interval_days, repetitions + 1, now + timedelta(days=interval_days)
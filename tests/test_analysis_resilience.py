@@ -0,0 +1,195 @@
+"""Opakování, oprava JSON a záložní modely TextAnalyzer proti lokálnímu stubu OpenAI."""
+import time
+
+import pytest
+
+import analysis
+from analysis import PROMPT_VERSION, TextAnalyzer
+from analysis_cache import AnalysisCache, MemoryBackend, make_cache_key
+from benchmarks.stub_openai import STUB_RESULT, StubOpenAIServer
+
+TEXT = 'Buňka je základní stavební jednotka živých organismů.'
+
+
+class RecordingInstrumentation:
+    """Zaznamená volání observe_* místo exportu metrik"""
+
+    def __init__(self):
+        self.responses = []
+        self.retries = []
+        self.fallbacks = []
+
+    def observe_openai(self, model, mode, seconds, usage=None, error=False):
+        pass
+
+    def observe_openai_response(self, model, outcome):
+        self.responses.append((model, outcome))
+
+    def observe_openai_retry(self, model, reason):
+        self.retries.append((model, reason))
+
+    def observe_openai_fallback(self, model):
+        self.fallbacks.append(model)
+
+    def observe_openai_coalesced(self, model):
+        pass
+
+
+class RecordingClock:
+    """Modul time pro analysis: sleep jen zaznamená čekání, ostatní funkce jsou skutečné"""
+
+    def __init__(self):
+        self.sleeps = []
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Čekání mezi opakováními se zaznamená místo skutečného spánku"""
+    clock = RecordingClock()
+    monkeypatch.setattr(analysis, 'time', clock)
+    return clock.sleeps
+
+
+@pytest.fixture
+def make_analyzer(monkeypatch):
+    analyzers = []
+    servers = []
+
+    def make(stub_options=None, **options):
+        stub = StubOpenAIServer(latency=0, stream_chunks=5, **(stub_options or {})).start()
+        servers.append(stub)
+        monkeypatch.setenv('OPENAI_BASE_URL', stub.base_url)
+        monkeypatch.setenv('OPENAI_API_KEY', 'test')
+        options.setdefault('model', 'primary')
+        options.setdefault('backoff', 0.1)
+        analyzer = TextAnalyzer(
+            AnalysisCache([MemoryBackend()]), instrumentation=RecordingInstrumentation(), **options
+        )
+        analyzers.append(analyzer)
+        return analyzer, stub
+
+    yield make
+    for analyzer in analyzers:
+        analyzer.close()
+    for stub in servers:
+        stub.stop()
+
+
+def assert_stub_result(result):
+    assert 'error' not in result
+    assert result['summary'] == STUB_RESULT['summary']
+    assert result['questions'] == STUB_RESULT['questions']
+    assert result['flashcards'] == STUB_RESULT['flashcards']
+
+
+def test_falls_back_to_second_model(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer(
+        {'failing_models': ['primary']}, fallback_models=['backup'], max_retries=1
+    )
+
+    result = analyzer.analyze(TEXT)
+
+    assert_stub_result(result)
+    assert result['model'] == 'backup'
+    assert stub.requests_by_model == {'primary': 2, 'backup': 1}
+    assert analyzer.instrumentation.fallbacks == ['backup']
+    assert analyzer.instrumentation.retries == [('primary', 'http_500')]
+
+
+def test_retries_with_exponential_backoff(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer({'error_rate': 1.0}, max_retries=3, backoff=0.1)
+
+    result = analyzer.analyze(TEXT)
+
+    assert result['error'].startswith('Chyba při analýze')
+    assert stub.requests_by_model == {'primary': 4}
+    assert len(analyzer.instrumentation.retries) == 3
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps, start=1):
+        base = 0.1 * 2 ** (attempt - 1)
+        assert 0.5 * base <= delay <= 1.5 * base
+
+
+@pytest.mark.parametrize('kind', StubOpenAIServer.MALFORMED_KINDS)
+def test_repairs_malformed_json(make_analyzer, sleeps, kind):
+    analyzer, stub = make_analyzer({'malformed_rate': 1.0, 'malformed_kinds': [kind]})
+
+    result = analyzer.analyze(TEXT)
+
+    assert 'error' not in result
+    assert result['summary'] == STUB_RESULT['summary']
+    if kind == 'truncated':
+        # Useknuté kartičky se vynechají, zbytek výsledku zůstane
+        assert result['questions'] == STUB_RESULT['questions']
+        assert result['flashcards'] == STUB_RESULT['flashcards'][:len(result['flashcards'])]
+    else:
+        assert_stub_result(result)
+    assert stub.requests == 1
+    assert analyzer.instrumentation.responses == [('primary', 'repaired')]
+    assert sleeps == []
+
+
+def test_error_result_when_all_models_fail(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer(
+        {'failing_models': ['primary', 'backup']}, fallback_models=['backup'], max_retries=1
+    )
+
+    result = analyzer.analyze(TEXT)
+
+    assert result['error'].startswith('Chyba při analýze')
+    assert result['questions'] == [] and result['flashcards'] == []
+    assert stub.requests_by_model == {'primary': 2, 'backup': 2}
+    # Chybový výsledek se do cache neukládá, další pokus znovu volá API
+    assert analyzer.cache.get(make_cache_key(TEXT, 'primary', PROMPT_VERSION)) is None
+
+
+def test_stream_falls_back_when_stream_fails_before_first_item(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer(
+        {'failing_models': ['primary']}, fallback_models=['backup'], max_retries=0
+    )
+
+    events = list(analyzer.stream(TEXT))
+
+    section, result = events[-1]
+    assert section == 'done'
+    assert_stub_result(result)
+    assert result['model'] == 'backup'
+    assert len(events) == 1 + sum(len(STUB_RESULT[name]) for name in ('summary', 'questions', 'flashcards'))
+
+
+def test_successful_result_is_cached(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer()
+
+    first = analyzer.analyze(TEXT)
+    second = analyzer.analyze(TEXT)
+
+    assert_stub_result(first)
+    assert second == first
+    assert stub.requests == 1
+
+
+def test_cache_counts_each_analysis_once(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer()
+
+    for text in (TEXT, 'Mitochondrie zajišťují buněčné dýchání.', TEXT):
+        analyzer.analyze(text)
+
+    stats = analyzer.cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+
+
+def test_cache_probe_counts_only_hits(make_analyzer, sleeps):
+    analyzer, stub = make_analyzer()
+
+    assert analyzer.cached(TEXT) is None
+    analyzer.analyze(TEXT)
+    assert analyzer.cached(TEXT)['summary'] == STUB_RESULT['summary']
+
+    stats = analyzer.cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
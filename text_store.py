@@ -0,0 +1,115 @@
+"""Úložiště textu extrahovaného z nahraných dokumentů, adresované obsahem souboru.
+
+Nahraný soubor se hashuje (SHA-256) už při čtení z requestu. Když stejný
+soubor nahraje další uživatel (např. PDF sdílené celou třídou), text se
+vezme z úložiště a extrakce se přeskočí. Na stejný text pak sedí i cache
+výsledků analýzy. Úložiště je SQLite soubor s omezenou velikostí; při
+jejím překročení se mažou nejdéle nepoužité záznamy (LRU).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def read_upload(stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Přečte nahraný soubor po blocích a zároveň ho hashuje; vrací (data, hex digest)"""
+    digest = hashlib.sha256()
+    chunks = []
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        digest.update(chunk)
+        chunks.append(chunk)
+    return b''.join(chunks), digest.hexdigest()
+
+
+def upload_key(digest, extension, char_budget):
+    """Klíč úložiště; extrahovaný text závisí i na extraktoru (příponě) a limitu znaků"""
+    return f'{digest}:{extension}:{char_budget or 0}'
+
+
+class ExtractedTextStore:
+    """Extrahované texty v SQLite souboru, velikost omezená na ``max_bytes`` (komprimovaně)"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=15)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS extracted_texts ('
+            ' key TEXT PRIMARY KEY,'
+            ' text BLOB NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' last_used REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_extracted_texts_last_used ON extracted_texts (last_used)')
+        self._conn.commit()
+
+    def get(self, key):
+        """Vrátí uložený text nebo None"""
+        with self._lock:
+            row = self._conn.execute('SELECT text FROM extracted_texts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute('UPDATE extracted_texts SET last_used = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+        return zlib.decompress(row[0]).decode('utf-8')
+
+    def set(self, key, text):
+        """Uloží text a odstraní nejdéle nepoužité záznamy nad limitem velikosti"""
+        data = zlib.compress(text.encode('utf-8'))
+        if len(data) > self.max_bytes:
+            return False
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO extracted_texts (key, text, size, last_used) VALUES (?, ?, ?, ?)',
+                (key, data, len(data), time.time())
+            )
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def _evict(self):
+        # Součet se počítá z databáze, soubor může sdílet víc procesů
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM extracted_texts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        oldest = self._conn.execute('SELECT key, size FROM extracted_texts ORDER BY last_used')
+        evicted = []
+        for key, size in oldest:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany('DELETE FROM extracted_texts WHERE key = ?', evicted)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute('DELETE FROM extracted_texts')
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM extracted_texts').fetchone()[0]
+
+    def stats(self):
+        """Počitadla zásahů a minutí a obsazené místo pro monitoring"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extracted_texts'
+            ).fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}